@@ -5,7 +5,7 @@ from __future__ import annotations
 import os
 import json
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, astuple
 from typing import Dict, List, Iterable, Tuple
 
 from aqt import mw, gui_hooks
@@ -146,6 +146,7 @@ def get_entries_for_editor() -> List[dict]:
     return _load_entries_from_json()
 
 def set_color_table_entries(entries: List[dict]) -> None:
+    _COMBINED_REGEX_CACHE.clear()
     cfg = _ensure_cfg_initialized()
     cfg["color_entries"] = entries
     _write_cfg(cfg)
@@ -789,6 +790,25 @@ def build_combined_regex(color_table: Dict[str, str], opts: ColoringOptions) ->
     flags = re.IGNORECASE if opts.case_insensitive else 0
     return re.compile(pattern, flags), group_to_color
 
+# Compiled (regex, group_to_color) per (table, options); cleared when the table is saved
+_COMBINED_REGEX_CACHE: Dict[tuple, Tuple[re.Pattern, Dict[str, str]]] = {}
+
+def get_combined_regex(color_table: Dict[str, str], opts: ColoringOptions) -> Tuple[re.Pattern, Dict[str, str]]:
+    """build_combined_regex, memoized on the table contents and coloring options."""
+    key = (tuple(sorted(color_table.items())), astuple(opts))
+    hit = _COMBINED_REGEX_CACHE.get(key)
+    if hit is None:
+        hit = _COMBINED_REGEX_CACHE[key] = build_combined_regex(color_table, opts)
+    return hit
+
+# Fixed patterns used on every field by apply_color_coding_to_html (compiled once)
+_IMG_ONLY_RE      = re.compile(r'\s*(<img[^>]+>\s*)+', re.IGNORECASE)
+_CLOZE_PROTECT_RE = re.compile(r'\{\{c\d+::.*?\}\}', re.DOTALL)
+_CC_SPAN_RE       = re.compile(r'<span class="cc-color"[^>]*>(.*?)</span>', re.DOTALL | re.IGNORECASE)
+_BOLD_ITALIC_RE   = re.compile(r'</?(b|strong|i|em)[^>]*>', re.IGNORECASE)
+_TAG_SPLIT_RE     = re.compile(r"(<[^>]+>)")
+_PLACEHOLDER_RE   = re.compile(r'(__CLOZE_PLACEHOLDER_\d+__)')
+
 def apply_color_coding_to_html(
     html: str,
     regex: re.Pattern,
@@ -802,7 +822,8 @@ def apply_color_coding_to_html(
     # --- SAFETY: do not touch pure-image or occlusion fields ---
     # If the HTML is only an <img> tag, or multiple <img> tags, or whitespace around them,
     # we return it unchanged. This prevents ANY accidental corruption.
-    if re.fullmatch(r'\s*(<img[^>]+>\s*)+', html, flags=re.IGNORECASE):
+    has_tags = "<" in html  # plain-text fields skip every markup pass below
+    if has_tags and _IMG_ONLY_RE.fullmatch(html):
         return html, 0
     
 
@@ -819,34 +840,28 @@ def apply_color_coding_to_html(
             s = s.replace(f"__CLOZE_PLACEHOLDER_{i}__", original)
         return s
 
-    if not getattr(opts, "color_inside_cloze", False):
+    if not getattr(opts, "color_inside_cloze", False) and "{{c" in html:
         # default (safe): do NOT color inside cloze
-        html = re.sub(r'\{\{c\d+::.*?\}\}', _cloze_protect, html, flags=re.DOTALL)
+        html = _CLOZE_PROTECT_RE.sub(_cloze_protect, html)
 
 
 
     # --- SAFE STRIP: never use '\1', always use lambda ---
-    html = re.sub(
-        r'<span class="cc-color"[^>]*>(.*?)</span>',
-        lambda m: m.group(1),  # safest possible: always returns original text
-        html,
-        flags=re.DOTALL | re.IGNORECASE,
-    )
+    if has_tags:
+        html = _CC_SPAN_RE.sub(
+            lambda m: m.group(1),  # safest possible: always returns original text
+            html,
+        )
 
-    # --- Remove all bold and italic markup (safe, minimal, preserves text) ---
-    html = re.sub(
-        r'</?(b|strong|i|em)[^>]*>',
-        '',
-        html,
-        flags=re.IGNORECASE
-    )
+        # --- Remove all bold and italic markup (safe, minimal, preserves text) ---
+        html = _BOLD_ITALIC_RE.sub('', html)
 
     if not opts.colorize:
         # Restore clozes BEFORE returning
         return _restore_clozes(html), 0
 
 
-    parts = re.split(r"(<[^>]+>)", html)  # split into text/tag chunks
+    parts = _TAG_SPLIT_RE.split(html) if has_tags else [html]  # text/tag chunks
     changed = False
     total = 0
 
@@ -855,7 +870,8 @@ def apply_color_coding_to_html(
             continue  # skip tags and already-colored chunks
 
         # --- NEW: protect placeholder islands inside this text chunk ---
-        segments = re.split(r'(__CLOZE_PLACEHOLDER_\d+__)', chunk)
+        segments = (_PLACEHOLDER_RE.split(chunk) if "__CLOZE_PLACEHOLDER_" in chunk
+                    else [chunk])
         if len(segments) == 1:
             # No placeholders → process as one block
             text_blocks = [(False, segments[0])]
@@ -1001,7 +1017,7 @@ def color_notes_in_decks(
     color_table = get_color_table()
     if not color_table:
         raise RuntimeError("Color table is empty. Configure your color mappings first.")
-    regex, group_to_color = build_combined_regex(color_table, opts)
+    regex, group_to_color = get_combined_regex(color_table, opts)
 
     notes_seen = 0
     notes_modified = 0
@@ -1024,6 +1040,7 @@ def color_notes_in_decks(
     mw.progress.start(label="Color Coding: scanning notes…", immediate=True, min=0, max=0)
     try:
         nids = mw.col.find_notes(search)
+        dirty = []  # written back in one batch after the scan
 
         for idx, nid in enumerate(nids):
             if mw.progress.want_cancel():
@@ -1041,8 +1058,9 @@ def color_notes_in_decks(
             for fname in note.keys():
                 original = note[fname]
                 new_val, num = apply_color_coding_to_html(original, regex, group_to_color, opts)
-                # Save even if only normalization changed
-                if new_val != original:
+                # Save even if only normalization changed. A field nothing touched comes
+                # back as the very same object → skip the O(len) compare
+                if new_val is not original and new_val != original:
                     note[fname] = new_val
                     modified = True
                     replacements_for_note += num
@@ -1050,11 +1068,20 @@ def color_notes_in_decks(
             if modified:
                 notes_modified += 1
                 total_replacements += replacements_for_note
-                note.flush()
+                dirty.append(note)
 
             if idx % 200 == 0:
                 mw.progress.update(label=f"Processing notes… ({idx+1}/{len(nids)})")
 
+        # One transaction for all modified notes (also after a cancel)
+        if dirty:
+            mw.progress.update(label=f"Saving {len(dirty)} note(s)…")
+            try:
+                mw.col.update_notes(dirty)
+            except Exception:
+                for note in dirty:  # older Anki: no update_notes
+                    note.flush()
+
         mw.reset()  # refresh UI
 
     finally:
@@ -0,0 +1,73 @@
+# debug_log.py — shared pdf2cards_debug.log writer
+# Callers only enqueue records; one listener thread owns the open file,
+# so hot loops don't pay an open()/write()/close() per debug line.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Optional
+
+_LOCK = threading.Lock()
+_LOGGER: Optional[logging.Logger] = None
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_ATEXIT = False
+
+
+def _log_path() -> str:
+    from aqt import mw
+    return os.path.join(mw.pm.profileFolder(), "pdf2cards_debug.log")
+
+
+def _get_logger() -> logging.Logger:
+    global _LOGGER, _LISTENER, _ATEXIT
+    if _LOGGER is not None:
+        return _LOGGER
+    with _LOCK:
+        if _LOGGER is None:
+            # Size-capped: ~2 MB per file, 3 backups (.1 .. .3)
+            fh = logging.handlers.RotatingFileHandler(
+                _log_path(), maxBytes=2_000_000, backupCount=3, encoding="utf-8")
+            fh.setFormatter(logging.Formatter("[%(asctime)s] %(message)s",
+                                              datefmt="%Y-%m-%d %H:%M:%S"))
+            q: queue.SimpleQueue = queue.SimpleQueue()
+            _LISTENER = logging.handlers.QueueListener(q, fh)
+            _LISTENER.start()
+            if not _ATEXIT:
+                atexit.register(shutdown)
+                _ATEXIT = True
+
+            logger = logging.getLogger("pdf2cards")
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False  # keep our lines out of Anki's own logs
+            logger.addHandler(logging.handlers.QueueHandler(q))
+            _LOGGER = logger
+    return _LOGGER
+
+
+def log(msg: str, tag: str = "") -> None:
+    """Queue one debug line (never raises)."""
+    try:
+        _get_logger().debug(f"[{tag}] {msg}" if tag else msg)
+    except Exception:
+        pass
+
+
+def shutdown() -> None:
+    """Flush queued lines and close the file (atexit / profile close)."""
+    global _LOGGER, _LISTENER
+    with _LOCK:
+        try:
+            if _LISTENER is not None:
+                _LISTENER.stop()  # drains the queue
+                for h in _LISTENER.handlers:
+                    h.close()
+        except Exception:
+            pass
+        if _LOGGER is not None:
+            for h in list(_LOGGER.handlers):
+                _LOGGER.removeHandler(h)
+        _LISTENER = None
+        _LOGGER = None
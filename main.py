@@ -2,9 +2,16 @@
 
 import os
 import re
+import sys
 import random
+import itertools
 import traceback
-import time
+import threading
+import hashlib
+import importlib
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
 
 from aqt import mw
@@ -12,36 +19,39 @@ from aqt.utils import showWarning
 from aqt.qt import (
     QAction, QFileDialog, QInputDialog, QDialog, QVBoxLayout, QHBoxLayout,
     QLabel, QCheckBox, QRadioButton, QSpinBox, QPushButton, QButtonGroup,
-    QColorDialog
+    QColorDialog, QDialogButtonBox, QScrollArea, QWidget, QLineEdit, QColor
 )
 
-from aqt.qt import (
-    QAction, QFileDialog, QInputDialog, QDialog, QVBoxLayout, QHBoxLayout,
-    QLabel, QCheckBox, QRadioButton, QSpinBox, QPushButton, QButtonGroup,
-    QColorDialog, QDialogButtonBox, QScrollArea, QWidget
-)
-
-from .pdf_parser import (
-    extract_words_with_boxes,
-    extract_image_boxes,
-    extract_text_from_pdf,
-    semantic_sentence_rects,   # <-- ADD THIS
-)
+from .debug_log import log as _log
 
 # Colorizer entry points (used from the Options dialog buttons)
 from .colorizer import open_coloration_settings_dialog, on_edit_color_table
 
+# PDF/OCR/AI backends load lazily: pdf_images imports PyMuPDF and pdf_parser /
+# openai_cards pull in requests — none of it is needed until a PDF is processed,
+# so Anki startup only pays for these thin forwarders.
+def _lazy(module: str, name: str):
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module, __package__), name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
 # Text/rect extraction and OCR-first page text
-from .pdf_parser import (
-    extract_words_with_boxes, boxes_for_phrase, sentence_rects_for_phrase,
-    extract_image_boxes, extract_text_from_pdf
-)
+extract_words_with_boxes = _lazy(".pdf_parser", "extract_words_with_boxes")
+extract_image_boxes      = _lazy(".pdf_parser", "extract_image_boxes")
+extract_text_from_pdf    = _lazy(".pdf_parser", "extract_text_from_pdf")
+semantic_sentence_rects  = _lazy(".pdf_parser", "semantic_sentence_rects")
+clear_words_cache        = _lazy(".pdf_parser", "clear_cache")
 
 # PNG rendering (plain and with highlights)
-from .pdf_images import render_page_as_png, render_page_as_png_with_highlights
+render_page_as_png                 = _lazy(".pdf_images", "render_page_as_png")
+render_page_as_png_with_highlights = _lazy(".pdf_images", "render_page_as_png_with_highlights")
+render_page_as_image               = _lazy(".pdf_images", "render_page_as_image")
+clear_render_cache                 = _lazy(".pdf_images", "clear_render_cache")
 
 # OpenAI-backed card/output helpers
-from .openai_cards import suggest_occlusions_from_image, generate_cards
+suggest_occlusions_from_image = _lazy(".openai_cards", "suggest_occlusions_from_image")
+generate_cards                = _lazy(".openai_cards", "generate_cards")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -51,38 +61,45 @@ from .openai_cards import suggest_occlusions_from_image, generate_cards
 _OCCLUSION_DPI = 200
 _IMAGE_MARGIN_PDF_PT = 36.0  # ~0.5″ margin around detected images
 _MAX_MASKS_PER_CROP = 12
+# Caps in-flight OpenAI requests across concurrently processed pages
+_OPENAI_SLOTS = threading.Semaphore(6)
+# Occlusion suggestions per distinct crop (digest → masks); cleared once no worker is running
+_OCCL_MEMO: Dict[bytes, list] = {}
+# Generation workers in flight; the shared caches are only dropped by the last one out
+_ACTIVE_WORKERS = 0
+_ACTIVE_WORKERS_LOCK = threading.Lock()
 ADDON_ID = os.path.basename(os.path.dirname(__file__))
 
-
-import math
-
-def _cosine(a, b):
-    return sum(x*y for x,y in zip(a,b)) / (
-        math.sqrt(sum(x*x for x in a)) * math.sqrt(sum(y*y for y in b)) + 1e-9
-    )
+# Note tags (interned once; shared by every inserted note)
+_TAG_CLOZE = sys.intern("pdf2cards:ai_cloze")
+_TAG_BASIC = sys.intern("pdf2cards:basic")
+_TAG_OCCLUSION = sys.intern("pdf2cards:ai_occlusion")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Debug logger
 # ──────────────────────────────────────────────────────────────────────────────
 
 def _dbg(msg: str) -> None:
-    """Append timestamped debug line to profile log."""
-    try:
-        path = os.path.join(mw.pm.profileFolder(), "pdf2cards_debug.log")
-        ts = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"[{ts}] {msg}\n")
-    except Exception:
-        pass
+    """Append timestamped debug line to profile log (queued; written off-thread)."""
+    _log(msg)
 
-def _is_real_cloze(text: str) -> bool:
-    import re
-    return bool(re.search(r"\{\{c\d+::.+?\}\}", text or ""))
+_HAS_CLOZE_RE = re.compile(r"\{\{c\d+::.+?\}\}", re.DOTALL)  # clozes may span lines
 
-import re
+def _is_real_cloze(text: str) -> bool:
+    # Substring probe short-circuits the (common) no-cloze case before the regex
+    return bool(text) and "{{c" in text and _HAS_CLOZE_RE.search(text) is not None
 
 _CLOZE_RE = re.compile(r"\{\{c(\d+)::(.*?)(?:(::)(.*?))?\}\}", re.DOTALL)
 
+# Same cloze span as _CLOZE_RE, as a single capturing group for re.split
+_CLOZE_SPLIT_RE = re.compile(r"(\{\{c\d+::.*?(?:::.*?)?\}\})", re.DOTALL)
+
+# Fields the post-generation colorizer touches (SlideImage etc. are skipped)
+_COLORABLE_FIELDS = frozenset({"Front", "Back", "Text", "Back Extra"})
+
+# Basic cards: escape template braces in one C-level pass
+_BRACE_ESC = str.maketrans({"{": "&#123;", "}": "&#125;"})
+
 def _style_from_colorizer_flags(color_hex: str, bold: bool, italic: bool) -> str:
     """Build a CSS style string for the cloze wrapper."""
     parts = [f"color:{color_hex};"]
@@ -96,47 +113,56 @@ def _wrap_all_clozes_with_style(text: str, style_str: str) -> str:
     """Wrap all cloze answers in a <span style="...">...</span>, preserving hints."""
     if not text or not isinstance(text, str) or not style_str:
         return text
+    if "{{c" not in text:
+        return text
+
+    # Span wrapper is invariant for the whole call; build it once
+    prefix = f'<span style="{style_str}">'
+    suffix = "</span>"
 
     def _one(m: re.Match) -> str:
         num = m.group(1)
         ans = m.group(2) or ""
-        has_hint = bool(m.group(3))
-        hint = m.group(4) or ""
         # If already contains a span with color, keep it (avoid double wrap)
         if "<span" in ans and "color:" in ans:
-            body = ans
-        else:
-            body = f'<span style="{style_str}">{ans}</span>'
-        if has_hint:
-            return f"{{{{c{num}::{body}::{hint}}}}}"
+            prefix_, suffix_ = "", ""
         else:
-            return f"{{{{c{num}::{body}}}}}"
-
-    return _CLOZE_RE.sub(_one, text)
-
-def _colors_from_color_table_safe() -> list[str]:
+            prefix_, suffix_ = prefix, suffix
+        if m.group(3):
+            return "".join(("{{c", num, "::", prefix_, ans, suffix_, "::", m.group(4) or "", "}}"))
+        return "".join(("{{c", num, "::", prefix_, ans, suffix_, "}}"))
+
+    # Single-cloze cards are the norm; let the engine stop after the first hit
+    return _CLOZE_RE.sub(_one, text, count=1 if text.count("{{c") == 1 else 0)
+
+_CSS_FUNC_RE = re.compile(r"(?:rgba?|hsla?)\(", re.IGNORECASE)
+
+def _is_css_color(s: str) -> bool:
+    """Loose check, same accept set as always: anything starting with "#" or
+    rgb(/rgba(/hsl(/hsla(, or a named color made of letters (spaces allowed)."""
+    if not isinstance(s, str):
+        return False
+    s = s.strip()
+    if not s:
+        return False
+    if s[0] == "#" or _CSS_FUNC_RE.match(s):
+        return True
+    low = s.lower()
+    return low[0].isalpha() and low.replace(" ", "").isalpha()
+
+# Palette cache for the current generation run (reset in _on_worker_done)
+_PALETTE_CACHE: Optional[list] = None
+
+def _colors_from_color_table_safe(refresh: bool = False) -> list[str]:
     """
     Extract a deduped list of usable CSS colors from the colorizer table.
     Accept #RRGGBB, #RGB, rgb()/rgba(), hsl()/hsla(), and CSS named colors.
     Also understands common keys like 'color', 'colour', 'hex', 'fg', 'css'.
     Falls back to a pleasant light palette if the table is empty.
     """
-    def _is_css_color(s: str) -> bool:
-        if not isinstance(s, str):
-            return False
-        s = s.strip()
-        if not s:
-            return False
-        if s.startswith("#"):
-            # accept #RGB, #RRGGBB, #RRGGBBAA, etc. (we’ll pass it through)
-            return True
-        low = s.lower()
-        return (
-            low.startswith("rgb(") or low.startswith("rgba(") or
-            low.startswith("hsl(") or low.startswith("hsla(") or
-            # crude allow-list for named colors; allow any a–z string
-            (low[0].isalpha() and all(ch.isalpha() for ch in low.replace(" ", "")))
-        )
+    global _PALETTE_CACHE
+    if _PALETTE_CACHE is not None and not refresh:
+        return _PALETTE_CACHE
 
     colors: list[str] = []
     seen = set()
@@ -182,32 +208,32 @@ def _colors_from_color_table_safe() -> list[str]:
     except Exception:
         pass
 
+    _PALETTE_CACHE = colors
     return colors
 
 
-def _wrap_one_cloze_answer(m: re.Match, color_hex: str) -> str:
+def _wrap_one_cloze_answer(m: re.Match, color_hex: str, prefix: Optional[str] = None) -> str:
     """Rebuild a single cloze with the answer wrapped in a span color, preserving hint."""
     num = m.group(1)
     ans = m.group(2) or ""
-    has_hint = bool(m.group(3))
-    hint = m.group(4) or ""
     # Avoid double-wrapping if answer already contains a span with a color.
     if "<span" in ans and "color:" in ans:
-        body = ans
-    else:
-        body = f'<span style="color:{color_hex};">{ans}</span>'
-    if has_hint:
-        return f"{{{{c{num}::{body}::{hint}}}}}"
+        prefix, suffix = "", ""
     else:
-        return f"{{{{c{num}::{body}}}}}"
+        prefix, suffix = (prefix or f'<span style="color:{color_hex};">'), "</span>"
+    if m.group(3):
+        return "".join(("{{c", num, "::", prefix, ans, suffix, "::", m.group(4) or "", "}}"))
+    return "".join(("{{c", num, "::", prefix, ans, suffix, "}}"))
 
 def _wrap_all_clozes_with_color(text: str, color_hex: str) -> str:
     """Wrap all cloze answers in the given text with a single color."""
-    if not text or not isinstance(text, str):
+    if not text or not isinstance(text, str) or "{{c" not in text:
         return text
     if not (isinstance(color_hex, str) and color_hex.startswith("#")):
         return text
-    return _CLOZE_RE.sub(lambda m: _wrap_one_cloze_answer(m, color_hex), text)
+    prefix = f'<span style="color:{color_hex};">'
+    return _CLOZE_RE.sub(lambda m: _wrap_one_cloze_answer(m, color_hex, prefix), text,
+                         count=1 if text.count("{{c") == 1 else 0)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -233,6 +259,7 @@ def _get_config() -> dict:
     c.setdefault("page_mode", "all")  # “all” or “range” (numeric range resets per PDF)
     c.setdefault("cloze_color_mode", "per_word")      # per_word | random_table | custom
     c.setdefault("cloze_custom_color_hex", "#FF69B4") # persisted like highlight color
+    c.setdefault("parallel_pages", 4)                 # pages processed concurrently by the worker
 
     return c
 
@@ -244,9 +271,31 @@ def _save_config(c: dict) -> None:
 # Small helpers
 # ──────────────────────────────────────────────────────────────────────────────
 
+_PAGE_COUNT_CACHE: Dict[tuple, int] = {}
+
 def _pdf_page_count(pdf_path: str) -> int:
-    """Return page count via QtPdf (parent=None for PyQt6 6.6.x) or pypdf fallback."""
-    # QtPdf (preferred)
+    """Return page count via pypdf (/Count) or QtPdf (parent=None for PyQt6 6.6.x) fallback."""
+    try:
+        key = (pdf_path, os.path.getmtime(pdf_path))
+    except OSError:
+        key = None
+    if key in _PAGE_COUNT_CACHE:
+        return _PAGE_COUNT_CACHE[key]
+    n = _pdf_page_count_uncached(pdf_path)
+    if key is not None and n:
+        _PAGE_COUNT_CACHE[key] = n
+    return n
+
+def _pdf_page_count_uncached(pdf_path: str) -> int:
+    # pypdf: len(pages) reads /Root → /Pages → /Count, no full document load
+    try:
+        from pypdf import PdfReader
+        n = len(PdfReader(pdf_path, strict=False).pages)
+        if n:
+            return n
+    except Exception:
+        pass
+    # QtPdf (last resort: loads and parses the whole document)
     try:
         from PyQt6.QtPdf import QPdfDocument
         qdoc = QPdfDocument(None)
@@ -255,12 +304,7 @@ def _pdf_page_count(pdf_path: str) -> int:
             return int(qdoc.pageCount())
     except Exception:
         pass
-    # pypdf (pure-Python fallback)
-    try:
-        from pypdf import PdfReader
-        return len(PdfReader(pdf_path).pages)
-    except Exception:
-        return 0
+    return 0
 
 def _rgba_from_hex(hex_str: str, alpha: int = 55):
     """Parse #RRGGBB into (r,g,b,a); alpha in 0..255."""
@@ -282,25 +326,68 @@ def _write_media_file(basename: str, data: bytes) -> Optional[str]:
     """Store bytes in Anki media. Return stored filename or None."""
     try:
         return mw.col.media.write_data(basename, data)
-    except Exception:
-        try:
-            import tempfile
-            tmp = os.path.join(tempfile.gettempdir(), basename)
-            with open(tmp, "wb") as f:
-                f.write(data)
-            return mw.col.media.add_file(tmp)
-        except Exception:
-            return None
+    except Exception as e:
+        _dbg(f"media.write_data failed ({e}); writing into the media folder directly")
+    # Fallback: write straight into the media folder (no temp-dir copy). The name
+    # carries a content hash, so identical bytes map to the same existing file.
+    try:
+        media_dir = mw.col.media.dir()
+        stem, ext = os.path.splitext(basename)
+        # No media-manager normalization on this path → keep the name filesystem/HTML safe
+        stem = re.sub(r"[^A-Za-z0-9_-]+", "_", stem)
+        name = f"{stem}_{hashlib.blake2b(data, digest_size=8).hexdigest()}{ext}"
+        dest = os.path.join(media_dir, name)
+        if not os.path.exists(dest):
+            fd, tmp = tempfile.mkstemp(dir=media_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, dest)  # atomic: never a half-written media file
+            except Exception:
+                try: os.remove(tmp)
+                except OSError: pass
+                raise
+        return name
+    except Exception as e:
+        _dbg(f"Media fallback write failed: {e}")
+        return None
 
-def _crop_png_region(png_bytes: bytes, rect_pt: dict, dpi: int) -> bytes:
-    """Crop PNG using Qt only (rect given in PDF points)."""
-    if not png_bytes:
-        return b""
+_ENCODE_TLS = threading.local()
+# Qt maps PNG "quality" to zlib level ((100-q)*9/91): 85 → level 1, several times
+# faster than the default level for a few % larger transient crops/masks
+_PNG_FAST_QUALITY = 85
+
+def _qimage_to_png_bytes(img) -> bytes:
+    """Encode a QImage as PNG bytes (Qt-only), reusing one QBuffer per thread."""
+    from PyQt6.QtCore import QBuffer, QIODevice
+    buf = getattr(_ENCODE_TLS, "buf", None)
+    if buf is None:
+        buf = _ENCODE_TLS.buf = QBuffer()
+    buf.open(QIODevice.OpenModeFlag.WriteOnly | QIODevice.OpenModeFlag.Truncate)
+    try:
+        img.save(buf, b"PNG", _PNG_FAST_QUALITY)
+    finally:
+        buf.close()
+    # Truncate on the next open() resets the contents; bytes() copies out
+    return bytes(buf.data())
+
+def _prepare_page_qimage(page_png: bytes):
+    """Decode a rendered page PNG once; returns a QImage or None.
+    Normalized to a raster-paint fast format so crops/copies are painted in place."""
+    if not page_png:
+        return None
     from PyQt6.QtGui import QImage
-    from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
-    img = QImage.fromData(png_bytes)
+    img = QImage.fromData(page_png)
     if img.isNull():
-        return b""
+        return None
+    fast = (QImage.Format.Format_ARGB32_Premultiplied if img.hasAlphaChannel()
+            else QImage.Format.Format_RGB32)
+    return img if img.format() == fast else img.convertToFormat(fast)
+
+def _crop_qimage(img, rect_pt: dict, dpi: int):
+    """Crop a decoded page QImage (rect given in PDF points); returns a QImage or None."""
+    if img is None:
+        return None
     scale = dpi / 72.0
     x = int(max(0, rect_pt.get("x", 0) * scale))
     y = int(max(0, rect_pt.get("y", 0) * scale))
@@ -308,22 +395,19 @@ def _crop_png_region(png_bytes: bytes, rect_pt: dict, dpi: int) -> bytes:
     h = int(max(1, rect_pt.get("h", 0) * scale))
     if x + w > img.width():  w = img.width() - x
     if y + h > img.height(): h = img.height() - y
-    if w <= 0 or h <= 0:     return b""
-    cropped = img.copy(x, y, w, h)
-    ba = QByteArray(); buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly)
-    cropped.save(buf, b"PNG"); buf.close()
-    return bytes(ba)
-
-def _mask_one_rect_on_png(png_bytes: bytes, rect_px: dict,
-                          fill=(242, 242, 242), outline=(160,160,160)) -> bytes:
-    """Draw a mask rectangle onto a PNG (pixel coords), Qt-only."""
-    if not png_bytes:
+    if w <= 0 or h <= 0:     return None
+    if x == 0 and y == 0 and w == img.width() and h == img.height():
+        return img  # whole page: no copy (QImage is implicitly shared; masks copy anyway)
+    return img.copy(x, y, w, h)
+
+def _mask_qimage(crop_img, rect_px: dict,
+                 fill=(242, 242, 242), outline=(160,160,160)) -> bytes:
+    """Draw a mask rectangle onto a copy of a cropped QImage (pixel coords) and encode to PNG."""
+    if crop_img is None:
         return b""
-    from PyQt6.QtGui import QImage, QPainter, QColor, QPen, QBrush
-    from PyQt6.QtCore import QByteArray, QBuffer, QIODevice, QRect
-    img = QImage.fromData(png_bytes)
-    if img.isNull():
-        return png_bytes
+    from PyQt6.QtGui import QPainter, QColor, QPen, QBrush
+    from PyQt6.QtCore import QRect
+    img = crop_img.copy()
     p = QPainter(img); p.setRenderHint(QPainter.RenderHint.Antialiasing)
     p.setBrush(QBrush(QColor(*fill)))
     pen = QPen(QColor(*outline)); pen.setWidth(2); p.setPen(pen)
@@ -332,9 +416,57 @@ def _mask_one_rect_on_png(png_bytes: bytes, rect_px: dict,
     if w > 0 and h > 0:
         p.drawRect(QRect(x, y, w, h))
     p.end()
-    ba = QByteArray(); buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly)
-    img.save(buf, b"PNG"); buf.close()
-    return bytes(ba)
+    return _qimage_to_png_bytes(img)
+
+def _new_note(col, model: dict):
+    """New note of `model` without switching the collection's current note type.
+    col.new_note(model) takes the type directly; older Anki needs set_current + newNote."""
+    new_note = getattr(col, "new_note", None)
+    if new_note is not None:
+        return new_note(model)
+    # set_current writes config; skip it when the type is already current
+    try:
+        same = col.models.current().get("id") == model.get("id")
+    except Exception:
+        same = False
+    if not same:
+        col.models.set_current(model)
+    return col.newNote()
+
+def _add_notes_bulk(notes: list, deck_id: int) -> list:
+    """Add new notes in one backend call (col.add_notes), else one by one.
+    Returns the notes that were actually added."""
+    if not notes:
+        return []
+    col = mw.col
+    try:
+        from anki.collection import AddNoteRequest
+        col.add_notes([AddNoteRequest(note=n, deck_id=deck_id) for n in notes])
+        return notes
+    except Exception as e:
+        _dbg(f"add_notes unavailable/failed, adding one by one: {e}")
+    added = []
+    for note in notes:
+        try:
+            col.addNote(note); added.append(note)
+        except Exception as e:
+            _dbg(f"Note add failed: {e}")
+    return added
+
+def _update_notes_bulk(notes: list) -> None:
+    """Write modified notes back in one call (col.update_notes), else flush each."""
+    if not notes:
+        return
+    update_notes = getattr(mw.col, "update_notes", None)
+    if update_notes is not None:
+        try:
+            update_notes(notes)
+            return
+        except Exception as e:
+            _dbg(f"update_notes failed, flushing one by one: {e}")
+    for note in notes:
+        try: note.flush()
+        except Exception as e: _dbg(f"Note flush failed: {e}")
 
 def force_move_cards_to_deck(cids: list, deck_id: int):
     """Move cards to target deck; tolerate API differences."""
@@ -354,6 +486,18 @@ def force_move_cards_to_deck(cids: list, deck_id: int):
 # Models (Basic + Slide / Cloze + Slide) — enforced fields, templates, CSS
 # ──────────────────────────────────────────────────────────────────────────────
 
+def _field_indices(m: dict) -> Dict[str, int]:
+    """Field name → position in note.fields (resolved once per model, not per note)."""
+    return {f.get("name"): i for i, f in enumerate(m.get("flds") or [])}
+
+def _model_signature(m: dict) -> tuple:
+    """The parts of a note type the ensure_* helpers enforce (to skip no-op saves)."""
+    return (
+        tuple(f.get("name") for f in (m.get("flds") or [])),
+        tuple((t.get("qfmt"), t.get("afmt")) for t in (m.get("tmpls") or [])),
+        m.get("css"),
+    )
+
 def ensure_basic_with_slideimage(model_name: str = "Basic + Slide") -> dict:
     """Ensure a Basic model with SlideImage field and responsive CSS."""
     col = mw.col
@@ -362,6 +506,7 @@ def ensure_basic_with_slideimage(model_name: str = "Basic + Slide") -> dict:
     if not m:
         m = col.models.new(model_name)
         created = True
+    before = None if created else _model_signature(m)
 
     # Fields
     want = ["Front", "Back", "SlideImage"]
@@ -390,8 +535,10 @@ def ensure_basic_with_slideimage(model_name: str = "Basic + Slide") -> dict:
         "height: auto; image-rendering: crisp-edges; }\n"
     )
 
+    # Saving a note type is a full schema write; only do it when something changed
     if created: col.models.add(m)
-    else:       col.models.save(m)
+    elif _model_signature(m) != before: col.models.save(m)
+    else: return m
     return col.models.byName(model_name)
 
 def get_basic_model_fallback():
@@ -411,6 +558,7 @@ def ensure_cloze_with_slideimage(model_name: str = "Cloze + Slide") -> dict:
     m = col.models.byName(model_name)
 
     def enforce(model):
+        before = _model_signature(model)
         # Fields
         want = ["Text", "Back Extra", "SlideImage"]
         have = [f["name"] for f in model.get("flds", [])]
@@ -432,7 +580,10 @@ def ensure_cloze_with_slideimage(model_name: str = "Cloze + Slide") -> dict:
             ".card img { max-width: 96vw !important; width: auto !important; "
             "height: auto; image-rendering: crisp-edges; }\n"
         )
-        col.models.save(model); return model
+        # Single save, and only when the note type actually changed
+        if _model_signature(model) != before:
+            col.models.save(model)
+        return model
 
     if not m:
         m = col.models.new(model_name); m["type"] = 1
@@ -444,8 +595,153 @@ def ensure_cloze_with_slideimage(model_name: str = "Cloze + Slide") -> dict:
 # Worker — PDF → OCR text → AI cards (+ optional occlusions) → per-card highlights
 # ──────────────────────────────────────────────────────────────────────────────
 
+def _process_one_page(page: dict, pdf_path: str, api_key: str, opts: dict):
+    """Generate cards (+ occlusions, highlight rects) for one OCR'd page.
+    Returns (results, errors); safe to run concurrently for different pages."""
+    results: List[dict] = []
+    page_errors: List[str] = []
+
+    mode = opts.get("per_slide_mode", "ai")
+    minv = int(opts.get("per_slide_min", 1))
+    maxv = int(opts.get("per_slide_max", 3))
+    if maxv < minv: minv, maxv = maxv, minv
+    highlight_enabled = opts.get("highlight_enabled", True)
+
+    page_no = page.get("page")
+    text = (page.get("text") or "").strip()
+    if not text:
+        _dbg(f"No OCR text on page {page_no} — skipping")
+        return results, page_errors
+
+    _dbg(f"Generating cards for page {page_no}: {len(text)} chars")
+    try:
+        cards = []
+        need_basic = opts.get("types_basic") or opts.get("types_cloze")
+        if need_basic:
+            _dbg(f"Calling OpenAI for BASIC cards on page {page_no}")
+            with _OPENAI_SLOTS:
+                out_basic = generate_cards(text, api_key, mode="basic")
+            cards += out_basic.get("cards", [])
+        if opts.get("types_cloze"):
+            with _OPENAI_SLOTS:
+                out_cloze = generate_cards(text, api_key, mode="cloze")
+            cards += out_cloze.get("cards", [])
+    except Exception as e:
+        page_errors.append(f"page {page_no}: {e}")
+        return results, page_errors
+
+    # Trim if “range” mode per slide
+    if mode == "range" and cards:
+        n = max(0, min(random.randint(minv, maxv), len(cards)))
+        # Stable partition (clozes first), stopping once n clozes are found;
+        # non-clozes beyond n can never make the cut
+        cloze_first, non_cloze = [], []
+        for c in cards:
+            if _is_real_cloze(c.get("front") or "") or _is_real_cloze(c.get("back") or ""):
+                cloze_first.append(c)
+                if len(cloze_first) >= n:
+                    break
+            elif len(non_cloze) < n:
+                non_cloze.append(c)
+        cards = (cloze_first + non_cloze)[:n]
+
+    # ----- 3) (Optional) auto-occlusion near images -----
+    try:
+        if bool(opts.get("occlusion_enabled", True)):
+            img_boxes = extract_image_boxes(pdf_path, page_no)
+            occl_cards = []
+            if img_boxes:
+                # Most pages have no figures; only those pay for the occlusion-DPI render.
+                # Decode the page once; crops and masks work on QImages and only encode at the end
+                page_png = render_page_as_png(pdf_path, page_no, dpi=_OCCLUSION_DPI, max_width=4000) or b""
+                page_img = _prepare_page_qimage(page_png)
+            for r_idx, ib in enumerate(img_boxes, start=1):
+                rect_pt = {
+                    "x": max(0.0, ib["x"] - _IMAGE_MARGIN_PDF_PT),
+                    "y": max(0.0, ib["y"] - _IMAGE_MARGIN_PDF_PT),
+                    "w": ib["w"] + 2.0 * _IMAGE_MARGIN_PDF_PT,
+                    "h": ib["h"] + 2.0 * _IMAGE_MARGIN_PDF_PT,
+                }
+                crop_img = _crop_qimage(page_img, rect_pt, dpi=_OCCLUSION_DPI)
+                if crop_img is None:
+                    continue
+                crop_png = page_png if crop_img is page_img else _qimage_to_png_bytes(crop_img)
+                # Repeated figures (logos, template art) → one vision call per distinct crop
+                digest = hashlib.blake2b(crop_png, digest_size=16).digest()
+                masks_px = _OCCL_MEMO.get(digest)
+                if masks_px is None:
+                    with _OPENAI_SLOTS:
+                        out = suggest_occlusions_from_image(crop_png, api_key, max_masks=_MAX_MASKS_PER_CROP, temperature=0.0)
+                    masks_px = _OCCL_MEMO[digest] = (out.get("masks") if isinstance(out, dict) else []) or []
+                for i, m in enumerate(masks_px, start=1):
+                    masked_png = _mask_qimage(crop_img, m)
+                    occl_cards.append({
+                        "front": "", "back": "", "page": page_no, "hi": [],
+                        "_occl_assets": {
+                            "base_crop_bytes": crop_png, "masked_bytes": masked_png,
+                            "base_name":  f"occl_p{page_no}_r{r_idx}_base.png",
+                            "masked_name":f"occl_p{page_no}_r{r_idx}_m{i}.png",
+                        },
+                        "_occl_tag": _TAG_OCCLUSION
+                    })
+            cards += occl_cards
+    except Exception as e:
+        _dbg("Auto-occlusion error: " + repr(e))
+
+    # ----- 4) Compute highlight rects per produced card -----
+    # Words are only needed when some text card on this page gets highlights
+    page_words = []
+    if highlight_enabled and any(not c.get("_occl_assets") for c in cards):
+        try:
+            page_words = extract_words_with_boxes(pdf_path, page_no)
+        except Exception:
+            page_words = []
+
+    for card in cards:
+        if card.get("_occl_assets"):
+            results.append({
+                "front": card.get("front",""), "back": card.get("back",""),
+                "page": page_no, "hi": [],
+                "_occl_assets": card["_occl_assets"], "_occl_tag": card.get("_occl_tag")
+            })
+            continue
+
+        front = (card.get("front") or "").strip()
+        back  = (card.get("back")  or "").strip()
+
+        # Determine highlight text based on card type
+        is_cloze = _is_real_cloze(front) or _is_real_cloze(back)
+
+        if is_cloze:
+            rect_text = front      # Cloze: highlight based on front-side cloze text
+        else:
+            rect_text = back       # Basic: highlight based on back (actual answer)
+
+        # Compute highlight rects
+        hi_rects = []
+        if highlight_enabled:
+            try:
+                with _OPENAI_SLOTS:  # embeddings request
+                    hi_rects = semantic_sentence_rects(
+                        page_words,
+                        rect_text,   # <-- the correct source text depending on card type
+                        api_key,
+                        max_sentences=1
+                    )
+            except Exception as e:
+                _dbg(f"Semantic highlight error: {e}")
+                hi_rects = []
+
+        results.append({ "front": front, "back": back, "page": page_no, "hi": hi_rects })
+
+    return results, page_errors
+
+
 def _worker_generate_cards(pdf_path: str, api_key: str, opts: dict) -> Dict:
+    global _ACTIVE_WORKERS
     _dbg(f"WORKER START: pdf={pdf_path}, opts={opts}")
+    with _ACTIVE_WORKERS_LOCK:
+        _ACTIVE_WORKERS += 1
 
     def ui_update(label: str):
         try: mw.progress.update(label=label)
@@ -473,119 +769,27 @@ def _worker_generate_cards(pdf_path: str, api_key: str, opts: dict) -> Dict:
         results: List[dict] = []
         page_errors: List[str] = []
 
-        # ----- 2) For each page, generate content cards -----
-        mode = opts.get("per_slide_mode", "ai")
-        minv = int(opts.get("per_slide_min", 1))
-        maxv = int(opts.get("per_slide_max", 3))
-        if maxv < minv: minv, maxv = maxv, minv
-
-        for idx, page in enumerate(pages, start=1):
-            mw.taskman.run_on_main(lambda i=idx, t=total_pages: ui_update(f"Processing page {i} of {t}"))
-
-            text = (page.get("text") or "").strip()
-            if not text:
-                _dbg(f"No OCR text on page {page.get('page')} — skipping")
-                continue
-
-            _dbg(f"Generating cards for page {page['page']}: {len(text)} chars")
-            try:
-                cards = []
-                need_basic = opts.get("types_basic") or opts.get("types_cloze")
-                if need_basic:
-                    _dbg(f"Calling OpenAI for BASIC cards on page {page['page']}")
-                    out_basic = generate_cards(text, api_key, mode="basic")
-                    cards += out_basic.get("cards", [])
-                if opts.get("types_cloze"):
-                    out_cloze = generate_cards(text, api_key, mode="cloze")
-                    cards += out_cloze.get("cards", [])
-            except Exception as e:
-                page_errors.append(f"page {page['page']}: {e}")
-                continue
-
-            # Trim if “range” mode per slide
-            if mode == "range" and cards:
-                n = max(0, min(random.randint(minv, maxv), len(cards)))
-                cloze_first, non_cloze = [], []
-                for c in cards:
-                    f = (c.get("front") or ""); b = (c.get("back") or "")
-                    (cloze_first if "{{c" in (f+b) else non_cloze).append(c)
-                cards = (cloze_first + non_cloze)[:n]
-
-            # ----- 3) (Optional) auto-occlusion near images -----
-            try:
-                if bool(opts.get("occlusion_enabled", True)):
-                    img_boxes = extract_image_boxes(pdf_path, page["page"])
-                    occl_cards = []
-                    page_png = render_page_as_png(pdf_path, page["page"], dpi=_OCCLUSION_DPI, max_width=4000) or b""
-                    for r_idx, ib in enumerate(img_boxes, start=1):
-                        rect_pt = {
-                            "x": max(0.0, ib["x"] - _IMAGE_MARGIN_PDF_PT),
-                            "y": max(0.0, ib["y"] - _IMAGE_MARGIN_PDF_PT),
-                            "w": ib["w"] + 2.0 * _IMAGE_MARGIN_PDF_PT,
-                            "h": ib["h"] + 2.0 * _IMAGE_MARGIN_PDF_PT,
-                        }
-                        crop_png = _crop_png_region(page_png, rect_pt, dpi=_OCCLUSION_DPI)
-                        if not crop_png:
-                            continue
-                        out = suggest_occlusions_from_image(crop_png, api_key, max_masks=_MAX_MASKS_PER_CROP, temperature=0.0)
-                        masks_px = (out.get("masks") if isinstance(out, dict) else []) or []
-                        for i, m in enumerate(masks_px, start=1):
-                            masked_png = _mask_one_rect_on_png(crop_png, m)
-                            occl_cards.append({
-                                "front": "", "back": "", "page": page["page"], "hi": [],
-                                "_occl_assets": {
-                                    "base_crop_bytes": crop_png, "masked_bytes": masked_png,
-                                    "base_name":  f"occl_p{page['page']}_r{r_idx}_base.png",
-                                    "masked_name":f"occl_p{page['page']}_r{r_idx}_m{i}.png",
-                                },
-                                "_occl_tag": "pdf2cards:ai_occlusion"
-                            })
-                    cards += occl_cards
-            except Exception as e:
-                _dbg("Auto-occlusion error: " + repr(e))
-
-            # ----- 4) Compute highlight rects per produced card -----
-            try:
-                page_words = extract_words_with_boxes(pdf_path, page["page"])
-            except Exception:
-                page_words = []
-
-            for card in cards:
-                if card.get("_occl_assets"):
-                    results.append({
-                        "front": card.get("front",""), "back": card.get("back",""),
-                        "page": page["page"], "hi": [],
-                        "_occl_assets": card["_occl_assets"], "_occl_tag": card.get("_occl_tag")
-                    })
-                    continue
-
-                
-                front = (card.get("front") or "").strip()
-                back  = (card.get("back")  or "").strip()
-
-                # Determine highlight text based on card type
-                is_cloze = _is_real_cloze(front) or _is_real_cloze(back)
-
-                if is_cloze:
-                    rect_text = front      # Cloze: highlight based on front-side cloze text
-                else:
-                    rect_text = back       # Basic: highlight based on back (actual answer)
-
-                # Compute highlight rects
-                hi_rects = []
-                if opts.get("highlight_enabled", True):
-                    try:
-                        hi_rects = semantic_sentence_rects(
-                            page_words,
-                            rect_text,   # <-- the correct source text depending on card type
-                            api_key,
-                            max_sentences=1
-                        )
-                    except Exception as e:
-                        _dbg(f"Semantic highlight error: {e}")
-                        hi_rects = []
+        # ----- 2) Pages are independent (OpenAI-bound) → process them concurrently -----
+        workers = max(1, min(int(opts.get("parallel_pages", 4) or 1), total_pages))
+        per_page: Dict[int, tuple] = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futs = {
+                pool.submit(_process_one_page, page, pdf_path, api_key, opts): i
+                for i, page in enumerate(pages)
+            }
+            for done, fut in enumerate(as_completed(futs), start=1):
+                i = futs[fut]
+                try:
+                    per_page[i] = fut.result()
+                except Exception as e:
+                    per_page[i] = ([], [f"page {pages[i].get('page')}: {e}"])
+                mw.taskman.run_on_main(lambda d=done, t=total_pages: ui_update(f"Processing page {d} of {t}"))
 
-                results.append({ "front": front, "back": back, "page": page["page"], "hi": hi_rects })
+        # Reassemble in page order so card order matches the PDF
+        for i in range(total_pages):
+            page_results, errs = per_page.get(i, ([], []))
+            results.extend(page_results)
+            page_errors.extend(errs)
 
         return {"ok": True, "cards": results, "pages": total_pages,
                 "errors": page_errors, "meta": {"pdf_path": pdf_path}}
@@ -594,6 +798,62 @@ def _worker_generate_cards(pdf_path: str, api_key: str, opts: dict) -> Dict:
         tb = traceback.format_exc()
         return {"ok": False, "cards": [], "pages": 0, "errors": [],
                 "error": str(e), "traceback": tb}
+    finally:
+        # Word/render/occlusion caches are module-wide; another PDF may still be using them
+        with _ACTIVE_WORKERS_LOCK:
+            _ACTIVE_WORKERS -= 1
+            if not _ACTIVE_WORKERS:
+                clear_words_cache()
+                clear_render_cache()
+                _OCCL_MEMO.clear()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Slide rendering for insertion (pure; safe off the insert thread)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _render_slide_image(pdf_path: str, card: dict, opts: dict) -> Optional[bytes]:
+    """Render the card's slide (highlighted unless it's an occlusion card)."""
+    page_no = card.get("page")
+    if not (pdf_path and page_no):
+        return None
+    try:
+        if opts.get("highlight_enabled", True) and not card.get("_occl_assets"):
+            hi_rects = card.get("hi", []) or []
+            # Use persisted opacity sliders (0..255), with safe defaults
+            fill_alpha    = int(opts.get("highlight_fill_alpha", 140))
+            outline_alpha = int(opts.get("highlight_outline_alpha", 230))
+            fill_rgba     = _rgba_from_hex(opts.get("highlight_color_hex", "#FF69B4"), alpha=fill_alpha)
+            outline_rgba  = _rgba_from_hex(opts.get("highlight_color_hex", "#FF69B4"), alpha=outline_alpha)
+            _dbg(f"HIs: page={page_no} rects={len(hi_rects)}")
+            return render_page_as_png_with_highlights(
+                pdf_path, page_no, hi_rects,
+                dpi=300, max_width=4000,
+                fill_rgba=fill_rgba, outline_rgba=outline_rgba,
+                outline_width=2
+            )
+        # No overlay to keep crisp → JPEG: far smaller media files and a faster encode
+        return render_page_as_image(pdf_path, page_no, dpi=300, max_width=4000, fmt="jpeg")
+    except Exception as e:
+        _dbg(f"Image render failed: {e}")
+        return None
+
+def _prefetched_slide_renders(cards: list, pdf_path: str, opts: dict, ahead: int = 2):
+    """Yield each card's slide image in order, keeping up to `ahead` renders in flight."""
+    with ThreadPoolExecutor(max_workers=ahead) as pool:
+        it = iter(cards)
+        window = deque(pool.submit(_render_slide_image, pdf_path, c, opts)
+                       for c in itertools.islice(it, ahead))
+        while window:
+            fut = window.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                window.append(pool.submit(_render_slide_image, pdf_path, nxt, opts))
+            try:
+                yield fut.result()
+            except Exception as e:
+                _dbg(f"Image render failed: {e}")
+                yield None
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -611,6 +871,9 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
         showWarning(f"Generation failed.\n\nError: {result.get('error')}\n\n{tb_snip}")
         return
 
+    global _PALETTE_CACHE
+    _PALETTE_CACHE = None  # color table may have been edited since the last run
+
     cards = result.get("cards", []) or []
     pdf_path = result.get("meta", {}).get("pdf_path")
     _dbg(f"Worker produced {len(cards)} cards total")
@@ -636,24 +899,51 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
     if want_cloze:
         models["cloze"] = ensure_cloze_with_slideimage(models.get("cloze", {}).get("name", "Cloze + Slide"))
 
+    # Field positions per model; the loop assigns note.fields[i] directly
+    fidx_basic = _field_indices(models["basic"]) if want_basic else {}
+    fidx_cloze = _field_indices(models["cloze"]) if want_cloze else {}
+
     mw.progress.start(label=f"Inserting {len(cards)} card(s)…", immediate=True)
 
-    # ---- background: render slide+insert notes, return new note IDs ----
+    # ---- background: render slide+insert notes, return the new Note objects ----
     def _insert_and_render() -> list:
-        new_note_ids: list = []
+        # Built notes, added in one batch after the loop (kept as objects so coloring
+        # needn't re-fetch them). At most one per card → preallocate, fill by index
+        new_notes: list = [None] * len(cards)
+        n_new = 0
         try:
             total = len(cards)
 
-            
+            # Loop-invariant: the random cloze palette only depends on the color table
+            cloze_mode = str(opts.get("cloze_color_mode", "per_word"))
+            palette = _colors_from_color_table_safe() if cloze_mode == "random_table" else None
+
+            # Media name prefix: same for every card of this PDF
+            safe_deck = re.sub(r"[^A-Za-z0-9_-]+", "_", deck_name)
+            base_name = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.splitext(os.path.basename(pdf_path))[0])
+            stored_by_hash: Dict[bytes, str] = {}  # slide PNG digest → media filename
+
+            # Colorizer bold/italic flags for single-color clozes, read once
+            bold_on, italic_on = True, False
+            if cloze_mode in ("random_table", "custom"):
+                try:
+                    from .colorizer import _read_cfg as _cc_read_cfg
+                    cc = _cc_read_cfg() or {}
+                    bold_on = bool(cc.get("bold_enabled", True))
+                    italic_on = bool(cc.get("italic_enabled", False))
+                except Exception:
+                    pass
+
+            # Render the next cards' slides while this one is written/inserted
+            renders = _prefetched_slide_renders(cards, pdf_path, opts)
 
-            for idx, card in enumerate(cards, start=1):
+            for idx, (card, png) in enumerate(zip(cards, renders), start=1):
                 mw.taskman.run_on_main(lambda i=idx, t=total:
                     mw.progress.update(label=f"Rendering cards… ({i}/{t})"))
 
                 front = card.get("front","") or ""
                 back  = card.get("back","")  or ""
                 page_no = card.get("page")
-                hi_rects = card.get("hi", []) or []
                 fname = ""
                 occl_tag = None
 
@@ -671,37 +961,24 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
                     back  = f'<img src="{base_fn}">'
                     occl_tag = card.get("_occl_tag")
 
-                # Slide image (with optional highlights)
-                if pdf_path and page_no:
+                # Slide image (with optional highlights), rendered ahead by the prefetch pool
+                if png and isinstance(png, (bytes, bytearray)) and len(png) > 0:
                     try:
-                        if opts.get("highlight_enabled", True) and not assets:
-                            # Use persisted opacity sliders (0..255), with safe defaults
-                            fill_alpha    = int(opts.get("highlight_fill_alpha", 140))
-                            outline_alpha = int(opts.get("highlight_outline_alpha", 230))
-                            fill_rgba     = _rgba_from_hex(opts.get("highlight_color_hex", "#FF69B4"), alpha=fill_alpha)
-                            outline_rgba  = _rgba_from_hex(opts.get("highlight_color_hex", "#FF69B4"), alpha=outline_alpha)
-                            _dbg(f"HIs: page={page_no} rects={len(hi_rects)}")
-                            png = render_page_as_png_with_highlights(
-                                pdf_path, page_no, hi_rects,
-                                dpi=300, max_width=4000,
-                                fill_rgba=fill_rgba, outline_rgba=outline_rgba,
-                                outline_width=2
-                            )
-                        else:
-                            png = render_page_as_png(pdf_path, page_no, dpi=300, max_width=4000)
-
-                        if png and isinstance(png, (bytes, bytearray)) and len(png) > 0:
-                            safe_deck = re.sub(r"[^A-Za-z0-9_-]+", "_", deck_name)
-                            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-                            suggested = f"{safe_deck}_{base_name}_p{page_no}_c{idx}.png"
+                        # Cards sharing a page (and highlight) render identical bytes:
+                        # store each distinct image once and reuse its filename
+                        digest = hashlib.blake2b(png, digest_size=16).digest()
+                        fname = stored_by_hash.get(digest, "")
+                        if not fname:
+                            ext = "jpg" if png[:3] == b"\xff\xd8\xff" else "png"
+                            suggested = f"{safe_deck}_{base_name}_p{page_no}_{digest.hex()[:12]}.{ext}"
                             stored = _write_media_file(suggested, png)
                             if stored:
-                                fname = os.path.basename(stored)
+                                fname = stored_by_hash[digest] = os.path.basename(stored)
                                 _dbg(f"Stored slide image: {fname}")
-                        else:
-                            _dbg("Slide image bytes empty or invalid — skipping attachment.")
                     except Exception as e:
-                        _dbg(f"Image render failed: {e}")
+                        _dbg(f"Image store failed: {e}")
+                elif pdf_path and page_no:
+                    _dbg("Slide image bytes empty or invalid — skipping attachment.")
 
                 # Insert note
                 col = mw.col
@@ -711,78 +988,71 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
 
                 # Escape braces for Basic only (avoid template tidy edge-cases)
                 if not is_cloze:
-                    raw_front = raw_front.replace("{", "&#123;").replace("}", "&#125;")
-                    raw_back  = raw_back.replace("{", "&#123;").replace("}", "&#125;")
+                    raw_front = raw_front.translate(_BRACE_ESC)
+                    raw_back  = raw_back.translate(_BRACE_ESC)
 
                 if is_cloze and want_cloze:
                     try:
                         # --- Cloze coloring: decide and apply before insertion ---
-                        mode = str(opts.get("cloze_color_mode", "per_word"))
                         colored_front = raw_front
-                        if mode in ("random_table", "custom"):
+                        if cloze_mode in ("random_table", "custom"):
                             # Pick the single color
-                            if mode == "custom":
+                            if cloze_mode == "custom":
                                 color_hex = str(opts.get("cloze_custom_color_hex") or "#FF69B4")
                             else:
-                                colors = _colors_from_color_table_safe()
-                                color_hex = random.choice(colors) if colors else str(opts.get("highlight_color_hex", "#FF69B4"))
-
-                            # Read colorizer style flags (bold/italic) so we can include them
-                            try:
-                                from .colorizer import _read_cfg as _cc_read_cfg
-                                cc = _cc_read_cfg() or {}
-                                bold_on = bool(cc.get("bold_enabled", True))
-                                italic_on = bool(cc.get("italic_enabled", False))
-                            except Exception:
-                                bold_on = True
-                                italic_on = False
+                                color_hex = random.choice(palette) if palette else str(opts.get("highlight_color_hex", "#FF69B4"))
 
                             style_str = _style_from_colorizer_flags(color_hex, bold_on, italic_on)
                             colored_front = _wrap_all_clozes_with_style(raw_front, style_str)
 
 
-                        model = models["cloze"]; col.models.set_current(model)
-                        note = col.newNote(); note.did = deck_id
-                        note["Text"] = colored_front
-                        note["Back Extra"] = raw_back
+                        note = _new_note(col, models["cloze"]); note.did = deck_id
+                        note.fields[fidx_cloze["Text"]] = colored_front
+                        note.fields[fidx_cloze["Back Extra"]] = raw_back
 
-                        if "SlideImage" in note and fname:
-                            note["SlideImage"] = f'<img src="{fname}">'
-                        note.tags.append("pdf2cards:ai_cloze")
+                        if fname and "SlideImage" in fidx_cloze:
+                            note.fields[fidx_cloze["SlideImage"]] = f'<img src="{fname}">'
+                        note.tags.append(_TAG_CLOZE)
                         if occl_tag: note.tags.append(occl_tag)
-                        if not _is_real_cloze(note["Text"]):
+                        if not _is_real_cloze(colored_front):
                             _dbg("No real cloze at insertion — will fall back to Basic.")
                         else:
-                            col.addNote(note); new_note_ids.append(note.id)
-                            try: force_move_cards_to_deck([c.id for c in note.cards()], deck_id)
-                            except Exception: pass
+                            new_notes[n_new] = note; n_new += 1
                             continue
                     except Exception as e:
                         _dbg(f"Cloze insert failed; falling back to Basic: {repr(e)}")
 
                 if want_basic:
                     try:
-                        model = models["basic"]; col.models.set_current(model)
-                        note = col.newNote(); note.did = deck_id
-                        note["Front"] = raw_front; note["Back"]  = raw_back
-                        if "SlideImage" in note and fname:
-                            note["SlideImage"] = f'<img src="{fname}">'
-                        note.tags.append("pdf2cards:basic")
+                        note = _new_note(col, models["basic"]); note.did = deck_id
+                        note.fields[fidx_basic["Front"]] = raw_front
+                        note.fields[fidx_basic["Back"]]  = raw_back
+                        if fname and "SlideImage" in fidx_basic:
+                            note.fields[fidx_basic["SlideImage"]] = f'<img src="{fname}">'
+                        note.tags.append(_TAG_BASIC)
                         if occl_tag: note.tags.append(occl_tag)
-                        col.addNote(note); new_note_ids.append(note.id)
-                        try: force_move_cards_to_deck([c.id for c in note.cards()], deck_id)
-                        except Exception: pass
+                        new_notes[n_new] = note; n_new += 1
                     except Exception as e:
                         _dbg(f"Basic insert failed: {repr(e)}")
                         continue
 
-            col.save()
         except Exception as e:
             _dbg("Insert/render error: " + repr(e))
-        return new_note_ids
+        del new_notes[n_new:]
+        if not _ACTIVE_WORKERS:
+            clear_render_cache()  # page renders are only reused within one batch
+        # All notes go in with one backend call / one transaction
+        new_notes = _add_notes_bulk(new_notes, deck_id)
+        # One deck move for every inserted card (instead of one per note)
+        try: force_move_cards_to_deck([c.id for n in new_notes for c in n.cards()], deck_id)
+        except Exception as e: _dbg(f"Bulk deck move failed: {e}")
+        # One save for the whole batch, even if the loop bailed out part-way
+        try: mw.col.save()
+        except Exception: pass
+        return new_notes
 
     # ---- main: color only the newly inserted notes (optional) ----
-    def _apply_color_on_main(new_nids: list):
+    def _apply_color_on_main(new_notes: list):
         try:
             cfg_gen = _get_config()
             if not bool(cfg_gen.get("color_after_generation", True)):
@@ -790,7 +1060,7 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
 
             try:
                 from .colorizer import (
-                    get_color_table, ColoringOptions, build_combined_regex,
+                    get_color_table, ColoringOptions, get_combined_regex,
                     apply_color_coding_to_html, _read_cfg as _cc_read_cfg
                 )
             except Exception as e:
@@ -803,8 +1073,9 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
                 mw.progress.finish(); return
 
 
+            # Read once per run; loop below only uses these locals
             cc = _cc_read_cfg() or {}
-            cc_mode = str(_get_config().get("cloze_color_mode", "per_word")).strip()
+            cc_mode = str(cfg_gen.get("cloze_color_mode", "per_word")).strip()
             opts_local = ColoringOptions(
                 whole_words=cc.get("whole_words", True),
                 case_insensitive=cc.get("case_insensitive", True),
@@ -815,88 +1086,113 @@ def _on_worker_done(result: Dict, deck_id: int, deck_name: str,
                 # NEW: per-word mode → color inside cloze; random/custom → keep protected
                 color_inside_cloze=(cc_mode == "per_word"),
             )
-            regex, group_to_color = build_combined_regex(color_table, opts_local)
+            regex, group_to_color = get_combined_regex(color_table, opts_local)
+
+            # Per-run memo: repeated field bodies (boilerplate, identical Back Extra, …)
+            # are colored once. Keyed by the HTML itself; str hashes are cached by Python.
+            memo: Dict[str, str] = {}
+            def _color(html: str) -> str:
+                out = memo.get(html)
+                if out is None:
+                    out = memo[html] = apply_color_coding_to_html(html, regex, group_to_color, opts_local)[0]
+                return out
 
 
-            if not new_nids:
+            if not new_notes:
                 mw.progress.finish(); return
 
-            mw.progress.update(label=f"Coloring {len(new_nids)} new note(s)…")
-            for i, nid in enumerate(new_nids, start=1):
+            mw.progress.update(label=f"Coloring {len(new_notes)} new note(s)…")
+
+            # Snapshot field HTML on main; the regex work below runs off the UI thread
+            # Only text fields are colored; SlideImage is an <img> blob
+            snapshot = [
+                (note, [(f, note[f]) for f in note.keys() if f in _COLORABLE_FIELDS])
+                for note in new_notes
+            ]
+        except Exception as e:
+            _dbg(f"Auto-color (new notes) failed: {repr(e)}")
+            mw.progress.finish(); return
+
+        def _colorize_bg() -> list:
+            """Pure-Python coloring over the snapshot → [(note, {fname: new_html})]."""
+            changes: list = []
+            total = len(snapshot)
+            label_tpl = f"Coloring… ({{i}}/{total})"  # total is fixed; only i varies
+            for i, (note, fields) in enumerate(snapshot, start=1):
+                nid = getattr(note, "id", None)
                 try:
-                    note = mw.col.get_note(nid)
-                    if not note: continue
-                    modified = False
-                    cfg_gen = _get_config()  # already read above in this function
-                    cc_mode = str(cfg_gen.get("cloze_color_mode", "per_word")).strip()
+                    updates: Dict[str, str] = {}
 
-                    for fname in note.keys():
+                    for fname, old in fields:
                         try:
-                            old = note[fname]
                             # If this is a cloze field and we used Random/Custom, preserve the single-color fill
                             # Skip recoloring *inside* cloze spans, but still color the rest of the text
                             if cc_mode in ("random_table", "custom") and fname.lower() in ("text",):
-                                if _is_real_cloze(old):
+                                # Cheap substring probe first; most fields carry no cloze at all
+                                if "{{c" in old and _is_real_cloze(old):
                                     # Apply colorizer only OUTSIDE cloze answers
                                     try:
-                                        # Split around cloze regions
-                                        parts = []
-                                        last_end = 0
-                                        for m in _CLOZE_RE.finditer(old):
-                                            # Part before the cloze → colorize normally
-                                            before = old[last_end:m.start()]
-                                            colored_before, _ = apply_color_coding_to_html(
-                                                before, regex, group_to_color, opts_local
-                                            )
-                                            parts.append(colored_before)
-
-                                            # Cloze itself → keep as-is (already wrapped with single color)
-                                            parts.append(m.group(0))
-                                            last_end = m.end()
-
-                                        # Remainder after last cloze
-                                        after = old[last_end:]
-                                        colored_after, _ = apply_color_coding_to_html(
-                                            after, regex, group_to_color, opts_local
-                                        )
-                                        parts.append(colored_after)
-
-                                        new = "".join(parts)
-
-                                        if new != old:
-                                            note[fname] = new
-                                            modified = True
+                                        # Split around cloze regions: [text, cloze, text, …, text].
+                                        # Text (even) → colorize normally; clozes (odd) → keep as-is
+                                        # (already wrapped with single color)
+                                        if old.count("{{c") == 1:
+                                            # Single cloze (the common case): slice, no regex split
+                                            idx = old.find("{{c")
+                                            end = old.find("}}", idx) + 2
+                                            new = _color(old[:idx]) + old[idx:end] + _color(old[end:])
+                                        else:
+                                            parts = _CLOZE_SPLIT_RE.split(old)
+                                            parts[::2] = [_color(t) for t in parts[::2]]
+                                            new = "".join(parts)
+
+                                        if new is not old and new != old:
+                                            updates[fname] = new
 
                                         continue
                                     except Exception as e:
                                         _dbg(f"Precise cloze skip failed: {e}")
                                         # Fallback to full-skip (safe)
                                         continue
-                            new, _ = apply_color_coding_to_html(old, regex, group_to_color, opts_local)
-                            if new != old:
-                                note[fname] = new; modified = True
+                            new = _color(old)
+                            # Unchanged fields usually come back as the same object → skip the compare
+                            if new is not old and new != old:
+                                updates[fname] = new
                         except Exception as e:
                             _dbg(f"Colorize field '{fname}' note {nid} error: {e}")
 
-                    if modified: note.flush()
+                    if updates: changes.append((note, updates))
                 except Exception as e:
                     _dbg(f"Colorize note {nid} error: {e}")
-                if i % 50 == 0 or i == len(new_nids):
-                    mw.progress.update(label=f"Coloring… ({i}/{len(new_nids)})")
-        except Exception as e:
-            _dbg(f"Auto-color (new notes) failed: {repr(e)}")
-        finally:
-            try: mw.taskman.run_on_main(lambda: mw.progress.finish())
-            except Exception: pass
+                # Repaint every 64 notes (and on the last); the label is only built here
+                if not (i & 63) or i == total:
+                    label = label_tpl.format(i=i)
+                    mw.taskman.run_on_main(lambda label=label: mw.progress.update(label=label))
+            return changes
+
+        def _install_on_main(fut):
+            """Apply the computed field changes and write them back in one batch."""
+            try:
+                changes = fut.result()
+                for note, updates in changes:
+                    for fname, new in updates.items():
+                        note[fname] = new
+                _update_notes_bulk([note for note, _ in changes])
+            except Exception as e:
+                _dbg(f"Auto-color (new notes) failed: {repr(e)}")
+            finally:
+                try: mw.progress.finish()
+                except Exception: pass
+
+        mw.taskman.run_in_background(_colorize_bg, on_done=_install_on_main)
 
     def _handle_done(fut):
         try:
-            new_nids = fut.result()
+            new_notes = fut.result()
         except Exception as e:
             _dbg(f"_insert_and_render failed: {e}")
             mw.taskman.run_on_main(lambda: mw.progress.finish())
             return
-        mw.taskman.run_on_main(lambda: _apply_color_on_main(new_nids))
+        mw.taskman.run_on_main(lambda: _apply_color_on_main(new_notes))
 
     mw.taskman.run_in_background(_insert_and_render, on_done=_handle_done)
 
@@ -944,7 +1240,6 @@ class OptionsDialog(QDialog):
         # ---------------------------------------------------------------------
         # Deck name (top)
         # ---------------------------------------------------------------------
-        from PyQt6.QtWidgets import QLineEdit
         row_deck = QHBoxLayout()
         row_deck.addWidget(QLabel("**Deck name**"))
         self.deck_edit = QLineEdit(self.default_deck_name or "")
@@ -984,7 +1279,6 @@ class OptionsDialog(QDialog):
             form_v.addWidget(rb)
 
         # Custom color picker (persisted)
-        from PyQt6.QtGui import QColor
         self.cloze_custom_hex = str(self.cfg.get("cloze_custom_color_hex", "#FF69B4"))
         self.btn_cloze_color = QPushButton("Pick custom color…")
         self.lbl_cloze_color = QLabel(f"Current: {self.cloze_custom_hex}")
@@ -1135,7 +1429,6 @@ class OptionsDialog(QDialog):
         self.lbl_color.setStyleSheet(
             f"padding:2px 6px; border:1px solid #aaa; background:{self.color_hex}; color:black;"
         )
-        from PyQt6.QtGui import QColor
         def pick_color():
             col = QColorDialog.getColor(QColor(self.color_hex))
             if col.isValid():
@@ -1194,7 +1487,7 @@ class OptionsDialog(QDialog):
 
     def options(self) -> dict:
         """Persist everything except numeric page range, and return run options."""
-        c = _get_config()
+        c = self.cfg  # already read (with defaults) when the dialog opened
         c["types_basic"]  = self.chk_basic.isChecked()
         c["types_cloze"]  = self.chk_cloze.isChecked()
         c["highlight_enabled"]    = self.chk_highlight.isChecked()
@@ -1238,6 +1531,7 @@ class OptionsDialog(QDialog):
             "occlusion_enabled": c["occlusion_enabled"],
             "cloze_color_mode": c["cloze_color_mode"],
             "cloze_custom_color_hex": c["cloze_custom_color_hex"],
+            "parallel_pages": int(c.get("parallel_pages", 4) or 1),
             "deck_name": (self.deck_edit.text() or "").strip(),
         }
 
@@ -1289,6 +1583,16 @@ def generate_from_pdf():
             return
         global_deck_name = (deck_name_text or default_deck_name).strip()
 
+    # Per-action memo: deck ids and note types are the same for every selected PDF,
+    # so each is looked up / enforced once per run instead of once per file
+    deck_ids: Dict[str, int] = {}
+    model_memo: Dict[str, dict] = {}
+    def _memo_model(key: str, make):
+        m = model_memo.get(key)
+        if m is None:
+            m = model_memo[key] = make()
+        return m
+
     for pdf_path in pdf_paths:
         # Compute defaults based on the file
         pdf_name = os.path.basename(pdf_path)
@@ -1310,17 +1614,21 @@ def generate_from_pdf():
 
         # Use the global deck name if present; otherwise, fall back to the dialog or default
         deck_name = (global_deck_name or opts.get("deck_name") or default_deck_name).strip()
-        deck_id = get_or_create_deck(deck_name)
+        deck_id = deck_ids.get(deck_name)
+        if deck_id is None:
+            deck_id = deck_ids[deck_name] = get_or_create_deck(deck_name)
         mw.col.decks.select(deck_id)
 
         # Ensure models based on chosen options
         models = {}
         if opts.get("types_basic"):
-            models["basic"] = get_basic_model_fallback() or ensure_basic_with_slideimage("Basic + Slide")
+            models["basic"] = _memo_model("basic", lambda: get_basic_model_fallback()
+                                          or ensure_basic_with_slideimage("Basic + Slide"))
         if opts.get("types_cloze"):
-            models["cloze"] = ensure_cloze_with_slideimage("Cloze + Slide")
+            models["cloze"] = _memo_model("cloze", lambda: ensure_cloze_with_slideimage("Cloze + Slide"))
         else:
-            models["cloze"] = mw.col.models.byName("Cloze + Slide") or ensure_cloze_with_slideimage("Cloze + Slide")
+            models["cloze"] = (model_memo.get("cloze") or mw.col.models.byName("Cloze + Slide")
+                               or _memo_model("cloze", lambda: ensure_cloze_with_slideimage("Cloze + Slide")))
 
         # Quick “Preparing …” progress repaint
         mw.taskman.run_on_main(lambda: mw.progress.start(label=f"Preparing {pdf_name}…", immediate=True))
@@ -1357,4 +1665,11 @@ def generate_from_pdf():
 def init_addon():
     action = QAction("Generate Anki cards from PDF", mw)
     action.triggered.connect(generate_from_pdf)
-    mw.form.menuTools.addAction(action)
\ No newline at end of file
+    mw.form.menuTools.addAction(action)
+    # The log lives in the profile folder: release it when the profile closes
+    try:
+        from aqt import gui_hooks
+        from .debug_log import shutdown as _log_shutdown
+        gui_hooks.profile_will_close.append(_log_shutdown)
+    except Exception:
+        pass
\ No newline at end of file
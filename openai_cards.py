@@ -1,58 +1,258 @@
+# openai_cards.py
+
+import base64
+import hashlib
+import json
+import os
+import re
+import requests
+from typing import Dict, Any
+
+# Shared queued logger (debug_log has no deps on this module → no import cycle)
+from .debug_log import log as _log
 
-# local no-op/debug logger to avoid circular import
 def _dbg(msg: str) -> None:
+    _log(msg)
+
+
+OPENAI_MODEL   = "gpt-4o-mini"
+TEMPERATURE    = 0.2
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+
+
+# --- Shared HTTP session (keep-alive + connection pool for all OpenAI calls) ---
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _retry_policy() -> Retry:
+    """Backoff retries for rate limits / transient 5xx and connect errors (POST included).
+    Read timeouts are never retried (read=0): the request may still be running and
+    billed server-side, so re-sending it only stacks duplicate generations.
+    Exponential backoff (capped at 30 s, jittered on urllib3 2) and the server's Retry-After
+    on 429/503 take precedence. raise_on_status=False hands the last response back, so
+    callers' raise_for_status still fires."""
+    kw = dict(total=5, read=0, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504],
+              respect_retry_after_header=True, raise_on_status=False)
     try:
-        from aqt import mw
-        import os, time
-        path = os.path.join(mw.pm.profileFolder(), "pdf2cards_debug.log")
-        ts = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"[{ts}] {msg}\n")
-    except Exception:
-        # Fall back to a silent no-op if we can't log
+        return Retry(allowed_methods=["POST", "GET"], backoff_max=30, backoff_jitter=1.0, **kw)
+    except TypeError:
         pass
-# openai_cards.py
+    try:
+        return Retry(allowed_methods=["POST", "GET"], **kw)
+    except TypeError:  # urllib3 < 1.26
+        return Retry(method_whitelist=["POST", "GET"], **kw)
 
-import json
-import requests
-from typing import Dict
 
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                       max_retries=_retry_policy()))
 
-# --- OCR helper (OpenAI Vision) ---
-import base64
-import requests
+# orjson (bundled with Anki) serializes the multi-MB image payloads several times
+# faster than stdlib json; fall back quietly if it's missing
+try:
+    import orjson as _orjson
+except Exception:
+    _orjson = None
 
-OPENAI_MODEL = "gpt-4o-mini"
+
+def _json_dumps_bytes(obj) -> bytes:
+    if _orjson is not None:
+        return _orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data):
+    """Parse str/bytes; raises json.JSONDecodeError (orjson's error subclasses it)."""
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def _resp_json(resp):
+    return _json_loads(resp.content)
+
+
+# Connect budget separate from the read budget: a dead network fails in seconds,
+# while a slow generation still gets the caller's full read timeout
+_CONNECT_TIMEOUT = 10.0
+
+
+def _post_openai(url: str, api_key: str, payload: dict, timeout: float):
+    """POST a JSON payload to OpenAI over the pooled session; returns the response.
+    timeout is the read budget (requests already asks for gzip/deflate bodies)."""
+    return _SESSION.post(
+        url,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        data=_json_dumps_bytes(payload),
+        timeout=(_CONNECT_TIMEOUT, timeout),
+    )
+
+
+# --- Persistent cache for AI responses (profile/pdf2cards_aicache.sqlite) ---
+# Keyed on the exact request payload, so any change to text/table/prompt misses.
+_AI_CACHE_TTL = 30 * 24 * 3600  # seconds
+# PDF2CARDS_NOCACHE=1 → always ask the API (nothing read or written)
+_AI_CACHE_OFF = os.environ.get("PDF2CARDS_NOCACHE", "") not in ("", "0")
+
+
+def _ai_cache_db():
+    import sqlite3
+    from aqt import mw
+    con = sqlite3.connect(os.path.join(mw.pm.profileFolder(), "pdf2cards_aicache.sqlite"), timeout=5)
+    con.execute("CREATE TABLE IF NOT EXISTS ai_cache (key BLOB PRIMARY KEY, ts INTEGER, payload BLOB)")
+    return con
+
+
+def _ai_cache_key(payload: dict) -> bytes:
+    return hashlib.blake2b(_json_dumps_bytes(payload), digest_size=32).digest()
+
+
+def _ai_cache_get(key: bytes):
+    """Cached entries list, or None if missing/expired/unreadable."""
+    if _AI_CACHE_OFF:
+        return None
+    try:
+        import time, zlib
+        con = _ai_cache_db()
+        try:
+            row = con.execute("SELECT ts, payload FROM ai_cache WHERE key = ?", (key,)).fetchone()
+        finally:
+            con.close()
+        if row and time.time() - row[0] < _AI_CACHE_TTL:
+            return _json_loads(zlib.decompress(row[1]))
+    except Exception as e:
+        _dbg(f"AI cache read failed: {e}")
+    return None
+
+
+def _ai_cache_put(key: bytes, entries) -> None:
+    if _AI_CACHE_OFF:
+        return
+    try:
+        import time, zlib
+        con = _ai_cache_db()
+        try:
+            with con:
+                con.execute("INSERT OR REPLACE INTO ai_cache VALUES (?, ?, ?)",
+                            (key, int(time.time()), zlib.compress(_json_dumps_bytes(entries))))
+                _ai_cache_evict(con)
+        finally:
+            con.close()
+    except Exception as e:
+        _dbg(f"AI cache write failed: {e}")
+
+
+_AI_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _ai_cache_evict(con) -> None:
+    """Over the size cap → drop the oldest half of the rows (by write time)."""
+    # Live pages only: deleted rows go to the freelist (reused), the file doesn't shrink
+    pages = (con.execute("PRAGMA page_count").fetchone()[0]
+             - con.execute("PRAGMA freelist_count").fetchone()[0])
+    page_size = con.execute("PRAGMA page_size").fetchone()[0]
+    if pages * page_size <= _AI_CACHE_MAX_BYTES:
+        return
+    con.execute("DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY ts "
+                "LIMIT (SELECT COUNT(*) / 2 FROM ai_cache))")
+
+
+# --- Structured Outputs: strict schemas → the model cannot emit malformed JSON ---
+def _json_schema(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+def _array_of(name: str, props: dict) -> dict:
+    """{"<name>": [ {props...} ]} with every property required (strict mode)."""
+    return {
+        "type": "object", "additionalProperties": False, "required": [name],
+        "properties": {name: {"type": "array", "items": {
+            "type": "object", "additionalProperties": False,
+            "required": list(props), "properties": props,
+        }}},
+    }
+
+_CARDS_FORMAT   = _json_schema("cards", _array_of("cards", {"front": {"type": "string"},
+                                                            "back":  {"type": "string"}}))
+_MASKS_FORMAT   = _json_schema("masks", _array_of("masks", {k: {"type": "integer"} for k in "xywh"}))
+_ENTRIES_FORMAT = _json_schema("entries", _array_of("entries", {"word":  {"type": "string"},
+                                                                "group": {"type": "string"},
+                                                                "color": {"type": "string"}}))
+
+
+# --- OCR helper (OpenAI Vision) ---
+def _image_data_url(image_bytes: bytes, mime: str = "image/png") -> str:
+    """data: URL for a vision request. Built inside the payload expression, so no
+    base64 copy outlives the call (the old local `b64` lived through the request)."""
+    return f"data:{mime};base64,{base64.b64encode(image_bytes).decode('ascii')}"
 
 def _limit_png_size_for_vision(png_bytes: bytes, max_bytes: int = 3_500_000) -> bytes:
     # If your PNG is too big, Vision sometimes returns empty output.
     if len(png_bytes) <= max_bytes:
         return png_bytes
     try:
+        from math import sqrt
         from PyQt6.QtGui import QImage
-        from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
+        from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODevice
         img = QImage.fromData(png_bytes)
         if img.isNull():
             return png_bytes
-        # scale down by 0.75 until under max_bytes (simple loop)
-        scale = 0.85
-        w, h = img.width(), img.height()
-        for _ in range(6):
-            w = max(1, int(w * scale))
-            h = max(1, int(h * scale))
-            small = img.scaled(w, h)
+        if img.hasAlphaChannel():
+            # Vision only needs RGB; an alpha channel forces larger, slower RGBA PNGs
+            img = img.convertToFormat(QImage.Format.Format_RGB888)
+
+        def _encode(scale: float) -> bytes:
+            small = img.scaled(max(1, int(img.width() * scale)), max(1, int(img.height() * scale)),
+                               Qt.AspectRatioMode.KeepAspectRatio,
+                               Qt.TransformationMode.SmoothTransformation)
             ba = QByteArray()
             buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly)
-            small.save(buf, b"PNG")
+            small.save(buf, b"PNG", 70)  # quality 70 ≈ zlib level 3: much faster, barely larger
             buf.close()
-            out = bytes(ba)
-            if len(out) <= max_bytes:
-                return out
-            img = small
+            return bytes(ba)
+
+        # Encoded size scales ~ with pixel count → pick the scale analytically,
+        # then at most one refinement (instead of a shrink-and-measure loop)
+        scale = sqrt(max_bytes / len(png_bytes)) * 0.95
+        out = _encode(scale)
+        if len(out) > max_bytes:
+            scale *= sqrt(max_bytes / len(out)) * 0.95
+            out = _encode(scale)
         return out
     except Exception:
         return png_bytes
-    
+
+
+# PDF2CARDS_USE_WEBP=1 → send OCR pages as lossless WebP (smaller than PNG on
+# text-heavy rasters); off by default until confirmed on every account tier
+_USE_WEBP = os.environ.get("PDF2CARDS_USE_WEBP", "") not in ("", "0")
+
+
+def _webp_for_vision(png_bytes: bytes):
+    """(bytes, mime): lossless WebP when enabled, supported by Qt and smaller; else the PNG."""
+    if not _USE_WEBP:
+        return png_bytes, "image/png"
+    try:
+        from PyQt6.QtGui import QImage, QImageWriter
+        from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
+        if b"webp" not in [bytes(f) for f in QImageWriter.supportedImageFormats()]:
+            return png_bytes, "image/png"
+        img = QImage.fromData(png_bytes)
+        if img.isNull():
+            return png_bytes, "image/png"
+        ba = QByteArray()
+        buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly)
+        ok = img.save(buf, b"WEBP", 100)  # Qt's WebP writer: quality 100 = lossless
+        buf.close()
+        if ok and 0 < ba.size() < len(png_bytes):
+            return bytes(ba), "image/webp"
+    except Exception as e:
+        _dbg(f"WebP encode failed: {e}")
+    return png_bytes, "image/png"
+
 
 def ocr_page_image(image_bytes: bytes, api_key: str) -> str:
     # Log: we want to see this in pdf2cards_debug.log
@@ -62,58 +262,35 @@ def ocr_page_image(image_bytes: bytes, api_key: str) -> str:
         _dbg("OCR ABORT: missing image or API key")
         return ""
 
-    import base64, requests
-    b64 = base64.b64encode(image_bytes).decode("ascii")
+    image_bytes, mime = _webp_for_vision(image_bytes)
 
+    # Same chat/completions endpoint + parser as every other call in this module
     payload = {
         "model": "gpt-4o-mini",
-        "input": [
+        "messages": [
             {
                 "role": "user",
                 "content": [
-                    {"type": "input_text", "text": "Extract all text. Plain text only."},
-                    {"type": "input_image", "image_url": f"data:image/png;base64,{b64}"},
+                    {"type": "text", "text": "Extract all text. Plain text only."},
+                    {"type": "image_url", "image_url": {"url": _image_data_url(image_bytes, mime)}},
                 ],
             }
         ],
     }
 
     try:
-        resp = requests.post(
-            "https://api.openai.com/v1/responses",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=60,
-        )
+        resp = _post_openai(OPENAI_API_URL, api_key, payload, timeout=60)
         _dbg(f"OCR HTTP: status={resp.status_code}")
         resp.raise_for_status()
-        data = resp.json()
-        text = (
-            data.get("output", [{}])[0]
-                .get("content", [{}])[0]
-                .get("text", "")
-                .strip()
-        )
+        text = (_resp_json(resp)["choices"][0]["message"].get("content") or "").strip()
         _dbg(f"OCR OK: {len(text)} chars")
         return text
     except Exception as e:
         _dbg(f"OCR ERROR: {repr(e)}")
         return ""
-    
-
-
-OPENAI_MODEL   = "gpt-4o-mini"
-TEMPERATURE    = 0.2
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 
 
 # --- Vision occlusion suggester (minimal, rectangles only) -------------------
-import base64
-from typing import Dict, Any
-# Reuse your existing OPENAI_API_URL / OPENAI_MODEL constants.
 OPENAI_VISION_MODEL = OPENAI_MODEL  # "gpt-4o-mini"
 
 SYSTEM_PROMPT_OCCLUSION = """
@@ -141,56 +318,93 @@ def suggest_occlusions_from_image(
 ) -> Dict[str, Any]:
     """
     Ask the LLM to propose rectangular occlusions (no labels).
-    Returns {"masks": [ {x:int, y:int, w:int, h:int}, ... ]}.
+    Returns {"masks": [ {x:int, y:int, w:int, h:int}, ... ]} in the coordinates
+    of the image passed in (the model may see a downscaled copy).
     """
-    b64 = base64.b64encode(image_bytes).decode("ascii")
+    send_bytes, mime, scale = _downscale_for_vision(image_bytes)
     user_content = [
         {"type": "text", "text": f"Detect up to {max_masks} tight label rectangles."},
-        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+        {"type": "image_url", "image_url": {"url": _image_data_url(send_bytes, mime)}}
     ]
-    resp = requests.post(
-        OPENAI_API_URL,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": OPENAI_VISION_MODEL,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT_OCCLUSION},
-                {"role": "user", "content": user_content},
-            ],
-            "temperature": temperature,
-            "response_format": {"type": "json_object"},
-        },
-        timeout=120,
-    )
+    payload = {
+        "model": OPENAI_VISION_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT_OCCLUSION},
+            {"role": "user", "content": user_content},
+        ],
+        "temperature": temperature,
+        "response_format": _MASKS_FORMAT,
+    }
+    resp = _post_openai(OPENAI_API_URL, api_key, payload, timeout=120)
     resp.raise_for_status()
-    content = resp.json()["choices"][0]["message"]["content"]
+    content = _resp_json(resp)["choices"][0]["message"]["content"]
     try:
-        data = json.loads(content)
-        masks = data.get("masks", [])
-        if not isinstance(masks, list):
-            return {"masks": []}
-        out = []
-        for m in masks[:max_masks]:
-            try:
-                out.append({
-                    "x": int(m.get("x", 0)),
-                    "y": int(m.get("y", 0)),
-                    "w": int(m.get("w", 0)),
-                    "h": int(m.get("h", 0)),
-                })
-            except Exception:
-                continue
-        # filter invalid
-        return {"masks": [m for m in out if m["w"] > 0 and m["h"] > 0]}
+        masks = _json_loads(content).get("masks", [])
     except json.JSONDecodeError:
         return {"masks": []}
+    masks = _parse_masks(masks, max_masks)
+    if scale != 1.0:
+        # Back to the caller's pixel grid
+        inv = 1.0 / scale
+        masks = [{k: int(round(v * inv)) for k, v in m.items()} for m in masks]
+    return {"masks": masks}
 
 
-# openai_cards.py
-# (only showing the parts to change)
+_VISION_MAX_EDGE = 1024
+
+
+def _downscale_for_vision(image_bytes: bytes, max_edge: int = _VISION_MAX_EDGE):
+    """
+    (bytes, mime, scale): long edge capped at max_edge and re-encoded as JPEG q85.
+    The vision model resizes internally anyway, so extra pixels only cost upload
+    time and input tokens. Small images (or no Qt) pass through at scale 1.0.
+    """
+    try:
+        from PyQt6.QtGui import QImage
+        from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODevice
+        img = QImage.fromData(image_bytes)
+        if img.isNull() or max(img.width(), img.height()) <= max_edge:
+            return image_bytes, "image/png", 1.0
+        scale = max_edge / float(max(img.width(), img.height()))
+        small = img.scaled(max(1, round(img.width() * scale)), max(1, round(img.height() * scale)),
+                           Qt.AspectRatioMode.IgnoreAspectRatio,
+                           Qt.TransformationMode.SmoothTransformation)
+        if small.hasAlphaChannel():
+            small = small.convertToFormat(QImage.Format.Format_RGB888)  # JPEG has no alpha
+        ba = QByteArray()
+        buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly)
+        ok = small.save(buf, b"JPEG", 85)
+        buf.close()
+        if not ok:
+            return image_bytes, "image/png", 1.0
+        # Actual per-axis ratio after integer rounding (x and y share it to <1px)
+        return bytes(ba), "image/jpeg", small.width() / float(img.width())
+    except Exception:
+        return image_bytes, "image/png", 1.0
+
+
+def _parse_masks(masks, max_masks: int) -> list:
+    """
+    Validate {x,y,w,h} masks once: the strict schema already guarantees ints, so
+    well-formed rows pass through a type check; anything else (floats/strings)
+    gets the coercing slow path. Zero/negative boxes are dropped.
+    """
+    if not isinstance(masks, list):
+        return []
+    out = []
+    for m in masks[:max_masks]:
+        if type(m) is not dict:
+            continue
+        x, y, w, h = m.get("x", 0), m.get("y", 0), m.get("w", 0), m.get("h", 0)
+        if not (type(x) is type(y) is type(w) is type(h) is int):
+            try:
+                x, y, w, h = int(x), int(y), int(w), int(h)
+            except Exception:
+                continue
+        if w > 0 and h > 0:
+            out.append({"x": x, "y": y, "w": w, "h": h})
+    return out
+
 
 SYSTEM_PROMPT_BASIC = """
 You are an expert study-card writer for science/medicine PDFs.
@@ -252,6 +466,65 @@ If no suitable cloze facts exist, return:
 { "cards": [] }
 """.strip()
 
+def _select_chunks(text: str, k: int = 8, window: int = 3000) -> str:
+    """
+    Bound the study text sent to the color-table prompts:
+    paragraphs packed into ~window-char chunks, exact and near-duplicate chunks
+    dropped (8-word shingle Jaccard >= 0.7), then k chunks sampled evenly
+    across the document so terminology from every section survives.
+    Deterministic: same text → same prompt → AI cache hits.
+    """
+    text = text or ""
+    if len(text) <= window:
+        return text
+
+    # Pack paragraphs into windows; hard-split paragraphs longer than one window
+    chunks, cur = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if len(para) > window and cur:
+            chunks.append(cur); cur = ""  # keep document order ahead of the hard split
+        while len(para) > window:
+            chunks.append(para[:window]); para = para[window:]
+        if not para:
+            continue
+        if cur and len(cur) + len(para) + 2 > window:
+            chunks.append(cur); cur = ""
+        cur = f"{cur}\n\n{para}" if cur else para
+    if cur:
+        chunks.append(cur)
+
+    def _h(s: str) -> bytes:
+        return hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest()
+
+    seen, kept, kept_shingles = set(), [], []
+    for c in chunks:
+        words = c.lower().split()
+        d = _h(" ".join(words))
+        if d in seen:
+            continue
+        seen.add(d)
+        sh = {_h(" ".join(words[i:i + 8])) for i in range(max(1, len(words) - 7))}
+        if any(len(sh & o) >= 0.7 * len(sh | o) for o in kept_shingles):
+            continue
+        kept.append(c); kept_shingles.append(sh)
+
+    if len(kept) > k:
+        step = len(kept) / k
+        kept = [kept[int(i * step)] for i in range(k)]
+    return "\n\n---\n\n".join(kept)
+
+def _entries_tsv(entries: list) -> str:
+    """Existing table as word<TAB>group<TAB>color lines (~3x fewer prompt tokens than JSON)."""
+    rows = []
+    for e in entries or []:
+        if isinstance(e, dict):
+            w, g, c = e.get("word", ""), e.get("group", ""), e.get("color", "")
+        else:
+            w, g, c = (list(e) + ["", "", ""])[:3]
+        rows.append(f"{w}\t{g}\t{c}")
+    return "\n".join(rows)
+
 def generate_color_table_revision(
     source_text: str,
     existing_entries: list,
@@ -290,48 +563,44 @@ OUTPUT (JSON ONLY):
     user_prompt = f"""
 Deck: {deck_hint}
 
-Existing table (you may reorganize freely):
-{existing_entries}
+Existing table (you may reorganize freely; TSV: word<TAB>group<TAB>hex):
+{_entries_tsv(existing_entries)}
 
 Study text:
 \"\"\"
-{source_text}
+{_select_chunks(source_text)}
 \"\"\"
 """
 
-    import requests, json
-    resp = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            "temperature": 0.2,
-        },
-        timeout=120,
-    )
+    payload = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        "temperature": 0.2,
+        "response_format": _ENTRIES_FORMAT,
+    }
+    cache_key = _ai_cache_key(payload)
+    cached = _ai_cache_get(cache_key)
+    if cached is not None:
+        _dbg("Color table revision: cache hit")
+        return cached
+
+    resp = _post_openai(OPENAI_API_URL, api_key, payload, timeout=120)
     resp.raise_for_status()
 
     try:
-        raw = resp.json()["choices"][0]["message"]["content"]
-        obj = json.loads(raw)
-        return obj.get("entries", [])
+        raw = _resp_json(resp)["choices"][0]["message"]["content"]
+        obj = _json_loads(raw)
+        entries = obj.get("entries", [])
     except Exception:
         return []
+    if entries:
+        _ai_cache_put(cache_key, entries)
+    return entries
 
-def generate_color_table_entries(
-    source_text: str,
-    existing_entries: list,
-    deck_hint: str,
-    api_key: str,
-):
-    system_prompt = """
+SYSTEM_PROMPT_COLOR_ENTRIES = """
 You are helping maintain a color-coding dictionary for Anki study decks.
 
 TASK:
@@ -376,15 +645,23 @@ FORMAT:
 }
 """.strip()
 
+def generate_color_table_entries(
+    source_text: str,
+    existing_entries: list,
+    deck_hint: str,
+    api_key: str,
+):
+    system_prompt = SYSTEM_PROMPT_COLOR_ENTRIES
+
     user_prompt = f"""
 Deck: {deck_hint}
 
-Existing entries:
-{json.dumps(existing_entries, ensure_ascii=False)}
+Existing entries (TSV: word<TAB>group<TAB>hex):
+{_entries_tsv(existing_entries)}
 
 Study text:
 \"\"\"
-{source_text}
+{_select_chunks(source_text)}
 \"\"\"
 """
 
@@ -399,6 +676,7 @@ Study text:
             {"role": "user", "content": user_prompt},
         ],
         "temperature": 0.2,
+        "response_format": _ENTRIES_FORMAT,
     }
 
     _dbg("=== AI COLOR TABLE REQUEST DEBUG ===")
@@ -417,93 +695,107 @@ Study text:
 
     _dbg("=== END AI COLOR TABLE REQUEST DEBUG ===")
 
-    resp = requests.post(
-        OPENAI_API_URL,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json=payload,
-        timeout=120,
-    )
+    cache_key = _ai_cache_key(payload)
+    cached = _ai_cache_get(cache_key)
+    if cached is not None:
+        _dbg("AI color table: cache hit")
+        return cached
+
+    resp = _post_openai(OPENAI_API_URL, api_key, payload, timeout=120)
     resp.raise_for_status()
 
     try:
-        data = json.loads(
-            resp.json()["choices"][0]["message"]["content"]
+        data = _json_loads(
+            _resp_json(resp)["choices"][0]["message"]["content"]
         )
-        return data.get("entries", [])
+        entries = data.get("entries", [])
     except Exception:
         return []
-
-def build_user_prompt_basic(text: str) -> str:
-    return f"""
+    if entries:
+        _ai_cache_put(cache_key, entries)
+    return entries
+
+# User prompts: constant head/tail split once at import; per call only the
+# lecture text is spliced in (no f-string re-render / .strip() of the whole prompt).
+# Text is exactly what the old f-strings produced (incl. their single-brace {c1::…}).
+_BASIC_HEAD, _BASIC_TAIL = """
 Create Anki **Basic** (Q→A) flashcards from the lecture text below.
 Return ONLY content cards; **exclude** instructor/university/admin/schedule/contact/credits.
 
 Lecture text:
 \"\"\"
-{text}
+\0
 \"\"\"
 
 Return JSON exactly as:
-{{
+{
   "cards": [
-    {{ "front": "…?", "back": "…" }}
+    { "front": "…?", "back": "…" }
   ]
-}}
-""".strip()
-
+}
+""".strip().split("\0")
 
-def build_user_prompt_cloze(text: str) -> str:
-    return f"""
+_CLOZE_HEAD, _CLOZE_TAIL = """
 Create Anki **Cloze** flashcards from the lecture text below.
 
 STRICT RULES:
-• Every card MUST contain exactly ONE {{c1::...}}.
+• Every card MUST contain exactly ONE {c1::...}.
 • Cards WITHOUT cloze markup MUST NOT be included.
 • Use declarative sentences only (no questions).
 
 Lecture text:
 \"\"\"
-{text}
+\0
 \"\"\"
 
 Return JSON exactly as:
-{{
+{
   "cards": [
-    {{ "front": "Declarative sentence with {{c1::hidden phrase}}.", "back": "" }}
+    { "front": "Declarative sentence with {c1::hidden phrase}.", "back": "" }
   ]
-}}
-""".strip()
+}
+""".strip().split("\0")
 
 
+def build_user_prompt_basic(text: str) -> str:
+    return "".join((_BASIC_HEAD, text, _BASIC_TAIL))
 
-def generate_cards(lecture_text: str, api_key: str, mode: str) -> Dict:
+
+def build_user_prompt_cloze(text: str) -> str:
+    return "".join((_CLOZE_HEAD, text, _CLOZE_TAIL))
+
+
+
+def _cards_payload(lecture_text: str, mode: str) -> dict:
     system_prompt = SYSTEM_PROMPT_BASIC if mode == "basic" else SYSTEM_PROMPT_CLOZE
     user_prompt   = build_user_prompt_basic(lecture_text) if mode == "basic" else build_user_prompt_cloze(lecture_text)
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": user_prompt}
+        ],
+        "temperature": TEMPERATURE,
+        # Strict schema: always a parseable {"cards": [{front, back}]}
+        "response_format": _CARDS_FORMAT
+    }
 
-    response = requests.post(
-        OPENAI_API_URL,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": OPENAI_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": user_prompt}
-            ],
-            "temperature": TEMPERATURE,
-            # Optional but helps: enforce JSON object output
-            "response_format": {"type": "json_object"}
-        },
-        timeout=120
-    )
-    response.raise_for_status()
-    content = response.json()["choices"][0]["message"]["content"]
+
+def _parse_cards(content) -> Dict:
+    """{"cards": [{front, back}, ...]} from model output; malformed → {"cards": []}."""
     try:
-        return json.loads(content)
+        data = _json_loads(content)
     except json.JSONDecodeError:
         return {"cards": []}
+    cards = data.get("cards") if type(data) is dict else None
+    if type(cards) is not list:
+        return {"cards": []}
+    if not all(type(c) is dict for c in cards):
+        data["cards"] = [c for c in cards if type(c) is dict]
+    return data
+
+
+def generate_cards(lecture_text: str, api_key: str, mode: str) -> Dict:
+    response = _post_openai(OPENAI_API_URL, api_key, _cards_payload(lecture_text, mode), timeout=120)
+    response.raise_for_status()
+    return _parse_cards(_resp_json(response)["choices"][0]["message"]["content"])
@@ -4,28 +4,41 @@
 # - Qt PDF rendering disabled (use PyMuPDF only)
 # - Fast highlight drawing (render once, draw on same pixmap)
 
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
 
-# --- debug logger ---
+# --- debug logger (shared queued writer; no open() per line) ---
+from .debug_log import log as _log
+
 def _dbg(msg: str) -> None:
-    try:
-        from aqt import mw
-        import os, time
-        path = os.path.join(mw.pm.profileFolder(), "pdf2cards_debug.log")
-        ts = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"[{ts}] [pdf_images] {msg}\n")
-    except Exception:
-        pass
+    _log(msg, "pdf_images")
 
 
 # ------------------------------------------------------------------------
 # Minimal PNG resize (Qt only — safe)
 # ------------------------------------------------------------------------
+_PNG_SIG = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_width(data: bytes) -> Optional[int]:
+    """Width from the IHDR chunk (bytes 16..20) without decoding; None if not a PNG."""
+    if len(data) >= 24 and data[:8] == _PNG_SIG and data[12:16] == b"IHDR":
+        return int.from_bytes(data[16:20], "big")
+    return None
+
+
 def _resize_png_qt(png_bytes: bytes, max_width: int = 1600) -> bytes:
+    # Already narrow enough → no full decode just to find out
+    w = _png_width(png_bytes)
+    if w is not None and w <= max_width:
+        return png_bytes
     try:
         from PyQt6.QtGui import QImage
-        from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
+        from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODevice
     except Exception:
         return png_bytes
 
@@ -33,8 +46,8 @@ def _resize_png_qt(png_bytes: bytes, max_width: int = 1600) -> bytes:
     if img.isNull() or img.width() <= max_width:
         return png_bytes
 
-    new_h = max(1, int((img.height() * max_width) / img.width()))
-    scaled = img.scaled(max_width, new_h)
+    # One pass, aspect kept by Qt (same Fast filter the plain scaled() call used)
+    scaled = img.scaledToWidth(max_width, Qt.TransformationMode.FastTransformation)
 
     ba = QByteArray()
     buf = QBuffer(ba)
@@ -138,18 +151,132 @@ def _import_fitz():
 # Grab the module (as 'fitz')
 fitz = _import_fitz()
 
+# MuPDF is not thread-safe: callers running pages concurrently serialize
+# every PyMuPDF call through this lock (shared with pdf_parser).
+_FITZ_LOCK = threading.RLock()
+
+
+# ------------------------------------------------------------------------
+# Open-document cache: one parse (xref, fonts, object cache) per PDF per run
+# instead of fitz.open() on every page. Only touched under _FITZ_LOCK.
+# ------------------------------------------------------------------------
+_DOCS: "OrderedDict[str, tuple]" = OrderedDict()  # path -> ((mtime, size), doc)
+_DOCS_MAX = 4
+
+
+def _open_doc(pdf_path: str):
+    """Cached fitz.Document for pdf_path (reopened if the file changed). Caller holds _FITZ_LOCK."""
+    try:
+        st = os.stat(pdf_path)  # one stat → (mtime, size) identity
+        sig = (st.st_mtime, st.st_size)
+    except OSError:
+        sig = (0.0, -1)
+    hit = _DOCS.get(pdf_path)
+    if hit is not None and hit[0] == sig:
+        _DOCS.move_to_end(pdf_path)
+        return hit[1]
+    if hit is not None:
+        _close_quietly(hit[1])
+    doc = fitz.open(pdf_path)
+    _DOCS[pdf_path] = (sig, doc)
+    while len(_DOCS) > _DOCS_MAX:
+        _close_quietly(_DOCS.popitem(last=False)[1][1])
+    return doc
+
+
+def _close_quietly(doc) -> None:
+    try:
+        doc.close()
+    except Exception:
+        pass
+
+
+def close_all() -> None:
+    """Close every cached document (end of a run / add-on unload)."""
+    with _FITZ_LOCK:
+        while _DOCS:
+            _close_quietly(_DOCS.popitem()[1][1])
+
+
+atexit.register(close_all)
+
+
+def _extract_largest_embedded_image_fitz(pdf_path: str, page_number: int) -> Optional[bytes]:
+    """Largest image XObject on the page via page.get_images + extract_image (no pypdf walk)."""
+    try:
+        with _FITZ_LOCK:
+            doc = _open_doc(pdf_path)
+            best, best_area = None, 0
+            for info in doc[page_number - 1].get_images(full=True):
+                w, h = info[2], info[3]  # (xref, smask, width, height, ...)
+                if w * h <= best_area:
+                    continue
+                d = doc.extract_image(info[0])
+                if d and d.get("image"):
+                    best, best_area = d["image"], w * h
+            return best
+    except Exception as e:
+        _dbg(f"PyMuPDF embedded-image lookup failed: {repr(e)}")
+        return None
+
 
 # ------------------------------------------------------------------------
 # PyMuPDF rendering
 # ------------------------------------------------------------------------
-def _render_with_pymupdf(pdf_path: str, page_number: int, dpi: int) -> Optional[bytes]:
+def _target_zoom(page, dpi: int, max_width: Optional[int]) -> float:
+    """dpi zoom, capped so the pixmap is at most max_width px wide (no resize pass later)."""
+    zoom = dpi / 72.0
+    w = page.rect.width
+    if max_width and w > 0:
+        # -0.01 px: keeps MuPDF's round-out of the pixmap box from landing on max_width+1
+        zoom = min(zoom, (max_width - 0.01) / w)
+    return zoom
+
+
+# Qt maps PNG "quality" to zlib level ((100-q)*9/91): 85 → level 1, several
+# times faster than MuPDF's default-level PNG writer for a few % larger files
+_PNG_FAST_QUALITY = 85
+
+
+_JPEG_QUALITY = 85
+
+
+def _pix_to_png(pix, fmt: str = "png") -> bytes:
+    """
+    Encode an RGB pixmap to PNG (or JPEG with fmt="jpeg"). Only the samples copy
+    holds _FITZ_LOCK; the encode runs in Qt outside it, so other threads can keep
+    rendering. Falls back to MuPDF's own encoder when Qt isn't usable.
+    """
+    jpeg = fmt == "jpeg"
+    with _FITZ_LOCK:
+        samples, w, h, stride = pix.samples, pix.width, pix.height, pix.stride
     try:
-        doc = fitz.open(pdf_path)
-        page = doc[page_number - 1]
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        out = pix.tobytes("png")
+        from PyQt6.QtGui import QImage
+        from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
+        img = QImage(samples, w, h, stride, QImage.Format.Format_RGB888)
+        ba = QByteArray()
+        buf = QBuffer(ba)
+        buf.open(QIODevice.OpenModeFlag.WriteOnly)
+        ok = img.save(buf, b"JPEG" if jpeg else b"PNG", _JPEG_QUALITY if jpeg else _PNG_FAST_QUALITY)
+        buf.close()
+        if ok:
+            return bytes(ba)
+    except Exception:
+        pass
+    with _FITZ_LOCK:
+        return pix.tobytes("jpg", jpg_quality=_JPEG_QUALITY) if jpeg else pix.tobytes("png")
+
+
+def _render_with_pymupdf(pdf_path: str, page_number: int, dpi: int,
+                         max_width: Optional[int] = None, fmt: str = "png") -> Optional[bytes]:
+    try:
+        with _FITZ_LOCK:
+            doc = _open_doc(pdf_path)
+            page = doc[page_number - 1]
+            zoom = _target_zoom(page, dpi, max_width)
+            mat = fitz.Matrix(zoom, zoom)
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+        out = _pix_to_png(pix, fmt)
         _dbg(f"PyMuPDF render OK ({pix.width}x{pix.height}@{dpi}dpi)")
         return out
     except Exception as e:
@@ -167,21 +294,66 @@ def render_page_as_png(
     dpi: int = 200,
     max_width: int = 2000,
 ) -> Optional[bytes]:
+    return render_page_as_image(pdf_path, page_number, dpi=dpi, max_width=max_width)
+
+
+def render_page_as_image(
+    pdf_path: str,
+    page_number: int,
+    dpi: int = 200,
+    max_width: int = 2000,
+    fmt: str = "png",
+) -> Optional[bytes]:
+    """
+    Page render as PNG (default) or JPEG (fmt="jpeg": q85, several times smaller
+    and faster to encode for photo-heavy slides). The embedded-image fallback
+    returns the image's own format either way; QImage.fromData sniffs it.
+    """
 
     _dbg("Qt disabled — using PyMuPDF only")
 
-    # PyMuPDF (built-in or vendor)
-    png = _render_with_pymupdf(pdf_path, page_number, dpi)
+    # PyMuPDF (built-in or vendor); repeated renders of the same page reuse bytes
+    try:
+        mtime = os.path.getmtime(pdf_path)
+    except OSError:
+        mtime = 0.0
+    try:
+        png = _cached_page_png(pdf_path, page_number, dpi, max_width, mtime, fmt)
+    except _RenderFailed:
+        png = None  # not memoized: the next call retries (file may still be being written)
     if png:
-        return _resize_png_qt(png, max_width=max_width)
-    # Fallback to embedded images
-    blob = _extract_largest_embedded_image(pdf_path, page_number)
+        return png
+    # Fallback to embedded images (arbitrary size → Qt downscale);
+    # PyMuPDF's C-side lookup first, pure-Python pypdf walk last
+    blob = (_extract_largest_embedded_image_fitz(pdf_path, page_number)
+            or _extract_largest_embedded_image(pdf_path, page_number))
     if blob:
         _dbg("Using embedded image fallback")
-        return blob
+        return _resize_png_qt(blob, max_width=max_width)
 
-    _dbg("render_page_as_png: all paths failed")
+    _dbg("render_page_as_image: all paths failed")
     return None
+
+
+class _RenderFailed(Exception):
+    """Raised out of _cached_page_png so lru_cache never stores a failed render."""
+
+
+@lru_cache(maxsize=16)
+def _cached_page_png(pdf_path: str, page_number: int, dpi: int, max_width: int,
+                     mtime: float, fmt: str = "png") -> bytes:
+    """PyMuPDF render at the final width, memoized; mtime in the key invalidates edited PDFs."""
+    data = _render_with_pymupdf(pdf_path, page_number, dpi, max_width=max_width, fmt=fmt)
+    if not data:
+        raise _RenderFailed(f"{pdf_path} p{page_number}")
+    return data
+
+
+def clear_render_cache() -> None:
+    _cached_page_png.cache_clear()
+    close_all()  # also release the file handles held by the doc cache
+
+
 def render_page_as_png_with_highlights(
     pdf_path,
     page_number,
@@ -200,11 +372,54 @@ def render_page_as_png_with_highlights(
       • relative fractions [0..1] -> scaled by page width/height
     Also clamps and filters suspicious rects to avoid page-wide floods.
     """
-    import fitz  # PyMuPDF
+    return render_highlighted_batch(
+        pdf_path, [(page_number, rects, 0)],
+        dpi=dpi, max_width=max_width,
+        fill_rgba=fill_rgba, outline_rgba=outline_rgba,
+        outline_width=outline_width,
+    )[0]
 
-    doc = fitz.open(pdf_path)
+
+def render_highlighted_batch(
+    pdf_path,
+    jobs,
+    dpi=200,
+    max_width=2000,
+    fill_rgba=(255, 255, 0, 80),
+    outline_rgba=(255, 0, 0, 200),
+    outline_width=2,
+):
+    """
+    Render many highlighted variants of one PDF in a single pass.
+    jobs: [(page_number, rects, out_key), ...]  ->  {out_key: png bytes | None}
+    The document is opened once (shared cache); each job's annots are
+    removed again before the next one, so variants never bleed together.
+    """
+    out = {}
+    for page_number, rects, key in jobs:
+        try:
+            # Nothing to draw → same bytes as a plain render (shared cache)
+            if not rects:
+                out[key] = render_page_as_png(pdf_path, page_number, dpi=dpi, max_width=max_width)
+                continue
+            with _FITZ_LOCK:
+                pix = _render_highlights_locked(
+                    pdf_path, page_number, rects, dpi, max_width,
+                    fill_rgba, outline_rgba, outline_width,
+                )
+            out[key] = _pix_to_png(pix)
+        except Exception as e:
+            _dbg(f"render_highlighted_batch: page {page_number} failed: {e}")
+            out[key] = None
+    return out
+
+
+def _render_highlights_locked(pdf_path, page_number, rects, dpi, max_width,
+                              fill_rgba, outline_rgba, outline_width):
+    doc = _open_doc(pdf_path)
+    page = doc[page_number - 1]
+    annots = []
     try:
-        page = doc[page_number - 1]
         page_rect = page.rect
 
         # Normalize RGBA into 0..1
@@ -215,6 +430,13 @@ def render_page_as_png_with_highlights(
         fr, fg, fb, fa = _norm(fill_rgba)
         or_, og, ob, oa = _norm(outline_rgba)
 
+        # Page geometry read once (not per rect)
+        pw, ph = page_rect.width, page_rect.height
+        px0, py0, px1, py1 = page_rect.x0, page_rect.y0, page_rect.x1, page_rect.y1
+        page_area = pw * ph
+        px_scale = 72.0 / float(dpi or 72.0)
+        Rect = fitz.Rect
+
         # Heuristic: convert various incoming rect formats into PDF points
         def _as_points(r, rect_count):
             if isinstance(r, dict):
@@ -232,48 +454,37 @@ def render_page_as_png_with_highlights(
                 return None
 
             # 1) Relative fractions 0..1 ?
-            is_rel = all(0.0 <= v <= 1.2 for v in (x, y, w, h))
+            is_rel = 0.0 <= x <= 1.2 and 0.0 <= y <= 1.2 and w <= 1.2 and h <= 1.2
             # 2) Way bigger than page -> likely pixels at 'dpi'
-            is_px = (
-                x > page_rect.width * 1.5
-                or y > page_rect.height * 1.5
-                or w > page_rect.width * 1.5
-                or h > page_rect.height * 1.5
-            )
+            is_px = x > pw * 1.5 or y > ph * 1.5 or w > pw * 1.5 or h > ph * 1.5
 
             if is_rel:
-                x *= page_rect.width
-                y *= page_rect.height
-                w *= page_rect.width
-                h *= page_rect.height
+                x *= pw
+                y *= ph
+                w *= pw
+                h *= ph
                 x1, y1 = x + w, y + h
             elif is_px:
-                scale = 72.0 / float(dpi or 72.0)
-                x *= scale; y *= scale; x1 *= scale; y1 *= scale
+                x *= px_scale; y *= px_scale; x1 *= px_scale; y1 *= px_scale
 
             # Clamp to page bounds
-            x0 = max(page_rect.x0, min(x, x1))
-            y0 = max(page_rect.y0, min(y, y1))
-            x1 = min(page_rect.x1, max(x, x1))
-            y1 = min(page_rect.y1, max(y, y1))
+            x0 = max(px0, min(x, x1))
+            y0 = max(py0, min(y, y1))
+            x1 = min(px1, max(x, x1))
+            y1 = min(py1, max(y, y1))
             if x1 - x0 < 1.0 or y1 - y0 < 1.0:
                 return None
 
             # If a rect is ~full-page and there are other rects,
             # treat it as suspicious and drop it.
-            page_area = page_rect.width * page_rect.height
-            area = (x1 - x0) * (y1 - y0)
-            if rect_count > 1 and area > 0.97 * page_area:
+            if rect_count > 1 and (x1 - x0) * (y1 - y0) > 0.97 * page_area:
                 return None
 
-            return fitz.Rect(x0, y0, x1, y1)
+            return Rect(x0, y0, x1, y1)
 
         rects = rects or []
-        norm_rects = []
-        for r in rects:
-            nr = _as_points(r, len(rects))
-            if nr is not None:
-                norm_rects.append(nr)
+        n_in = len(rects)
+        norm_rects = [nr for nr in (_as_points(r, n_in) for r in rects) if nr is not None]
 
         # Log what we ended up with
         try:
@@ -288,30 +499,17 @@ def render_page_as_png_with_highlights(
             annot.set_opacity(fa)  # overall opacity
             annot.set_border(width=outline_width)
             annot.update()
+            annots.append(annot)
 
-        # Render
-        zoom = dpi / 72.0
+        # Render straight at the output width (same cap as plain renders):
+        # annotation edges come out crisp instead of being downscaled afterwards
+        zoom = _target_zoom(page, dpi, max_width)
         mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        png = pix.tobytes("png")
-
-        # Optional resize with Qt (if available)
-        try:
-            from PyQt6.QtGui import QImage
-            from PyQt6.QtCore import QByteArray, QBuffer, QIODevice
-            img = QImage.fromData(png)
-            if img.width() > max_width:
-                nh = int(img.height() * (max_width / img.width()))
-                scaled = img.scaled(max_width, nh)
-                ba = QByteArray()
-                buf = QBuffer(ba)
-                buf.open(QIODevice.OpenModeFlag.WriteOnly)
-                scaled.save(buf, b"PNG")
-                buf.close()
-                return bytes(ba)
-        except Exception:
-            pass
-
-        return png
+        return page.get_pixmap(matrix=mat, alpha=False)
     finally:
-        doc.close()
\ No newline at end of file
+        # The doc is shared/cached: strip our annotations so the next render is clean
+        for annot in annots:
+            try:
+                page.delete_annot(annot)
+            except Exception:
+                pass
@@ -1,39 +1,111 @@
 # pdf_parser.py — SEMANTIC HIGHLIGHTING + OCR (fixed)
 
-from typing import List, Dict, Optional, Tuple
+from functools import lru_cache
+from typing import Iterator, List, Dict, Optional, Tuple
+import os
 import re
+import hashlib
+import itertools
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import math
-import requests
+import statistics
+import operator
 
-from .pdf_images import render_page_as_png
-from .openai_cards import ocr_page_image, _limit_png_size_for_vision
+from .pdf_images import render_page_as_png, _FITZ_LOCK, _open_doc
+from .openai_cards import (ocr_page_image, _limit_png_size_for_vision, _post_openai, _resp_json,
+                           _ai_cache_key, _ai_cache_get, _ai_cache_put)
+from .debug_log import log as _log
+
+def _dbg(msg: str) -> None:
+    _log(msg, "semantic_hi")
+
+# QtPdf is optional in some Qt builds; probed once here (pdf_parser loads lazily)
+try:
+    from PyQt6.QtPdf import QPdfDocument as _QPdfDocument
+except Exception:
+    _QPdfDocument = None
 
 # -------------------------------------------------------------------
 # CONFIG
 # -------------------------------------------------------------------
 
 HIGHLIGHT_MAX_SENTENCES = 2
+
+# Skip embeddings when one sentence already covers this share of the answer's
+# words (answers shorter than LEXICAL_MIN_TOKENS distinct words always embed)
+LEXICAL_MIN_COVERAGE = 0.80
+LEXICAL_MIN_TOKENS = 3
 HIGHLIGHT_PAGE_AREA_LIMIT = 0.70
 
 TITLE_FONT_SCALE = 1.35
 TITLE_TOP_FRACTION = 0.20
 CAPTION_PREFIXES = r"^(fig(ure)?\.?|table|diagram|schematic)\b"
+_CAPTION_RE = re.compile(CAPTION_PREFIXES, flags=re.I)
+
+# Parallel page OCR requests (network-bound; threads overlap the round-trips)
+try:
+    OCR_CONCURRENCY = max(1, int(os.environ.get("PDF2CARDS_OCR_CONCURRENCY", "8")))
+except ValueError:
+    OCR_CONCURRENCY = 8
+
+# Token pattern for the lexical matcher (compiled once, not per sentence)
+_WORD_RE = re.compile(r"\w+")
+
+# Sentence-final punctuation (was a per-word re.search for [.!?;:]\s*$)
+_SENT_ENDS = (".", "!", "?", ";", ":")
 
 # -------------------------------------------------------------------
 # Utility: cosine similarity
 # -------------------------------------------------------------------
 
-def _cosine(a, b):
-    return sum(x * y for x, y in zip(a, b)) / (
-        math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)) + 1e-9
-    )
+def _unit(v):
+    """Scale to unit length once, so each cosine afterwards is a single dot product."""
+    n = math.hypot(*v)
+    return [x / n for x in v] if n > 1e-9 else [0.0] * len(v)
+
+def _dot(a, b):
+    # map(mul) keeps the inner loop in C (no per-element Python frames)
+    return sum(map(operator.mul, a, b))
+
+# Embeddings by exact text, for the current run. Every card on a page re-ranks
+# the same page sentences, so only the card's own answer text is new per call.
+_EMB_CACHE: Dict[str, list] = {}
+_EMB_LOCK = threading.Lock()
+_EMB_CACHE_MAX = 20_000
+
 
 def embed_texts(texts, api_key):
+    """
+    Unit-length embeddings for texts (in order), so cosine similarity is a plain
+    _dot. Only texts not seen this run are requested.
+    Returns [] if the endpoint gave back a different number of vectors.
+    """
+    texts = list(texts)
+    with _EMB_LOCK:
+        known = {t: _EMB_CACHE[t] for t in texts if t in _EMB_CACHE}
+    missing = [t for t in dict.fromkeys(texts) if t not in known]
+
+    if missing:
+        fresh = _embed_uncached(missing, api_key)
+        if len(fresh) != len(missing):
+            return []
+        fresh = [_unit(v) for v in fresh]  # normalized once, at fetch time
+        known.update(zip(missing, fresh))
+        with _EMB_LOCK:
+            if len(_EMB_CACHE) + len(missing) > _EMB_CACHE_MAX:
+                _EMB_CACHE.clear()
+            _EMB_CACHE.update(zip(missing, fresh))
+
+    return [known[t] for t in texts]
+
+
+def _embed_uncached(texts, api_key):
     """
     Uses the correct OpenAI endpoint for gpt-4o-mini-embed:
     POST /v1/responses with type=input_text.
     """
-    import requests
     url = "https://api.openai.com/v1/responses"
 
     payload = {
@@ -48,18 +120,10 @@ def embed_texts(texts, api_key):
         "encoding_format": "float"
     }
 
-    resp = requests.post(
-        url,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        },
-        json=payload,
-        timeout=45
-    )
+    resp = _post_openai(url, api_key, payload, timeout=45)
 
     resp.raise_for_status()
-    data = resp.json()
+    data = _resp_json(resp)
 
     # Extract embeddings
     embeddings = []
@@ -73,6 +137,39 @@ def embed_texts(texts, api_key):
 # -------------------------------------------------------------------
 # OCR TEXT EXTRACTION (restored)
 # -------------------------------------------------------------------
+def _iter_page_renders(pdf_path: str, pages, ahead: int = 2):
+    """Yield (page, png) in order while the next `ahead` pages render in the
+    background, so rasterizing overlaps the (network-bound) OCR of the current page.
+    Threads, not processes: MuPDF calls are serialized by _FITZ_LOCK anyway and the
+    Qt resize / OCR wait run outside it; a process pool would re-spawn Anki."""
+    def _render(p):
+        return render_page_as_png(pdf_path, p, dpi=300, max_width=4000)
+    with ThreadPoolExecutor(max_workers=ahead) as pool:
+        it = iter(pages)
+        window = deque((p, pool.submit(_render, p)) for p in itertools.islice(it, ahead))
+        while window:
+            p, fut = window.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                window.append((nxt, pool.submit(_render, nxt)))
+            try:
+                yield p, fut.result()
+            except Exception:
+                yield p, None
+
+
+def _pdf_digest(pdf_path: str) -> Optional[str]:
+    """Content id for the OCR cache: first 1 MB + size + mtime (no full read).
+    The mtime catches edits past the first MB that keep the file size."""
+    try:
+        with open(pdf_path, "rb") as f:
+            head = f.read(1 << 20)
+            st = os.fstat(f.fileno())
+    except OSError:
+        return None
+    return hashlib.blake2b(head + f"{st.st_size}:{st.st_mtime_ns}".encode(), digest_size=16).hexdigest()
+
+
 def extract_text_from_pdf(
     pdf_path: str,
     api_key: str,
@@ -83,17 +180,30 @@ def extract_text_from_pdf(
     Return [{"page": int, "text": str}, ...] using page PNG + OCR.
     Uses QtPdf/pypdf for page count when possible; otherwise scans until failure.
     """
+    return list(iter_extract_text_from_pdf(pdf_path, api_key, page_start, max_pages))
+
+
+def iter_extract_text_from_pdf(
+    pdf_path: str,
+    api_key: str,
+    page_start: int = 1,
+    max_pages: Optional[int] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Like extract_text_from_pdf, but yields {"page", "text"} in page order as
+    pages finish, so callers can start on page 1 while later pages are in OCR.
+    """
     total_pages = 0
 
     # QtPdf (preferred)
-    try:
-        from PyQt6.QtPdf import QPdfDocument
-        qdoc = QPdfDocument()
-        qdoc.load(pdf_path)
-        if qdoc.status() == QPdfDocument.Status.Ready:
-            total_pages = int(qdoc.pageCount())
-    except Exception:
-        pass
+    if _QPdfDocument is not None:
+        try:
+            qdoc = _QPdfDocument()
+            qdoc.load(pdf_path)
+            if qdoc.status() == _QPdfDocument.Status.Ready:
+                total_pages = int(qdoc.pageCount())
+        except Exception:
+            pass
 
     # pypdf fallback
     if total_pages <= 0:
@@ -104,37 +214,103 @@ def extract_text_from_pdf(
         except Exception:
             total_pages = 0
 
-    results: List[Dict[str, str]] = []
+    # OCR text persists in the AI cache per (file content, page), so a re-run
+    # skips both the render and the Vision call for pages it has seen
+    digest = _pdf_digest(pdf_path)
 
-    # Unknown count: iterate until render fails
-    if total_pages <= 0:
-        cap = 500
-        idx = max(1, int(page_start))
-        remaining = int(max_pages or cap)
-        while remaining > 0 and idx <= cap:
-            png = render_page_as_png(pdf_path, idx, dpi=300, max_width=4000)
-            if not png:
-                break
-            png = _limit_png_size_for_vision(png, max_bytes=3_500_000)
-            text = ocr_page_image(png, api_key) or ""
-            results.append({"page": idx, "text": text})
-            idx += 1
-            remaining -= 1
-        return results
-
-    # Known count path
-    start = max(1, int(page_start))
-    end = total_pages if max_pages is None else min(total_pages, start + int(max_pages) - 1)
-    for p in range(start, end + 1):
-        png = render_page_as_png(pdf_path, p, dpi=300, max_width=4000)
-        if not png:
-            results.append({"page": p, "text": ""})
-            continue
-        png = _limit_png_size_for_vision(png, max_bytes=3_500_000)
-        text = ocr_page_image(png, api_key) or ""
-        results.append({"page": p, "text": text})
+    def _cache_key(p: int):
+        return _ai_cache_key({"ocr": digest, "page": p, "dpi": 300, "max_width": 4000}) if digest else None
+
+    cached: Dict[int, str] = {}
+
+    def _cached_text(p: int) -> Optional[str]:
+        key = _cache_key(p)
+        hit = _ai_cache_get(key) if key else None
+        if isinstance(hit, str) and hit:
+            cached[p] = hit
+            return hit
+        return None
+
+    # Pages render in order (prefetched); each OCR call goes to a pool so up to
+    # OCR_CONCURRENCY requests are in flight. Pages are yielded in order, each
+    # as soon as it and every page before it are done.
+    pending: deque = deque()  # (page, future | None), not yet yielded
+
+    # Repeated slides (section dividers, title templates) render to identical
+    # bytes: OCR each distinct image once per PDF
+    ocr_by_hash: Dict[bytes, object] = {}
+
+    def _ocr_one(png: bytes) -> str:
+        return ocr_page_image(_limit_png_size_for_vision(png, max_bytes=3_500_000), api_key) or ""
+
+    def _finish(p: int, fut) -> Dict[str, str]:
+        if p in cached:
+            return {"page": p, "text": cached[p]}
+        try:
+            text = fut.result() if fut is not None else ""
+        except Exception:
+            text = ""  # ocr_page_image already logs its own failures
+        if text and digest:
+            _ai_cache_put(_cache_key(p), text)
+        return {"page": p, "text": text}
+
+    def _ready():
+        while pending and (pending[0][1] is None or pending[0][1].done()):
+            yield _finish(*pending.popleft())
 
-    return results
+    # Cap queued pages so renders can't run far ahead of OCR (PNG bytes pile up)
+    in_flight: deque = deque()
+
+    pool = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY)
+    renders = None
+    try:
+        def _ocr(png: bytes):
+            key = hashlib.blake2b(png, digest_size=16).digest()
+            fut = ocr_by_hash.get(key)
+            if fut is None:
+                while len(in_flight) >= 2 * OCR_CONCURRENCY:
+                    wait([in_flight.popleft()])
+                fut = ocr_by_hash[key] = pool.submit(_ocr_one, png)
+                in_flight.append(fut)
+            return fut
+
+        # Unknown count: iterate until render fails
+        if total_pages <= 0:
+            cap = 500
+            idx = max(1, int(page_start))
+            remaining = int(max_pages or cap)
+            while remaining > 0 and idx <= cap:
+                if _cached_text(idx) is None:
+                    png = render_page_as_png(pdf_path, idx, dpi=300, max_width=4000)
+                    if not png:
+                        break
+                    pending.append((idx, _ocr(png)))
+                else:
+                    pending.append((idx, None))
+                yield from _ready()
+                idx += 1
+                remaining -= 1
+        else:
+            # Known count path
+            start = max(1, int(page_start))
+            end = total_pages if max_pages is None else min(total_pages, start + int(max_pages) - 1)
+            todo = [p for p in range(start, end + 1) if _cached_text(p) is None]
+            renders = _iter_page_renders(pdf_path, todo)
+            for p in range(start, end + 1):
+                fut = None
+                if p not in cached:
+                    _, png = next(renders)
+                    fut = _ocr(png) if png else None
+                pending.append((p, fut))
+                yield from _ready()
+
+        while pending:
+            yield _finish(*pending.popleft())
+    finally:
+        # Caller stopped early → drop queued OCR requests, stop prefetching
+        if renders is not None:
+            renders.close()
+        pool.shutdown(wait=True, cancel_futures=True)
 
 # -------------------------------------------------------------------
 # Line layout indexing
@@ -142,67 +318,105 @@ def extract_text_from_pdf(
 
 def _index_line_layout(page):
     """
-    Extract (block,line) → avg font size, y-position, text.
+    One rawdict pass → (words, line_info).
+      words:     [(x0,y0,x1,y1, "text", block, line, word_no), ...]  (same shape as get_text("words"))
+      line_info: (block,line) → avg font size, y-position, text.
     """
-    info = {}
+    words, info = [], {}
     try:
-        data = page.get_text("dict")
-        b_idx = -1
-        for b in data.get("blocks", []):
-            b_idx += 1
-            if b.get("type", 0) != 0:
+        data = page.get_text("rawdict")
+    except Exception:
+        return words, info
+    for b_idx, b in enumerate(data.get("blocks", [])):
+        if b.get("type", 0) != 0:
+            continue
+        for l_idx, ln in enumerate(b.get("lines", [])):
+            spans = ln.get("spans", [])
+            if not spans:
                 continue
-            lines = b.get("lines", [])
-            for l_idx, ln in enumerate(lines):
-                spans = ln.get("spans", [])
-                if not spans:
+            sizes = []
+            parts = []
+            word_no = 0
+            cur = []          # chars of the word being built
+            wx0 = wy0 = wx1 = wy1 = 0.0
+            for sp in spans:
+                chars = sp.get("chars", [])
+                if not chars:
                     continue
-                sizes = [float(s.get("size", 0.0)) for s in spans if s.get("text")]
-                line_text = "".join(s.get("text", "") for s in spans).strip()
-                x0, y0, x1, y1 = ln.get("bbox", [0, 0, 0, 0])
-                size_avg = sum(sizes) / max(1, len(sizes))
-                info[(b_idx, l_idx)] = {
-                    "size_avg": size_avg,
-                    "y0": float(y0),
-                    "text": line_text,
-                }
-    except Exception:
-        pass
-    return info
+                sizes.append(float(sp.get("size", 0.0)))
+                for ch in chars:
+                    c = ch.get("c", "")
+                    parts.append(c)
+                    # words split on whitespace only, and may cross span boundaries
+                    if not c or c.isspace():
+                        if cur:
+                            words.append((wx0, wy0, wx1, wy1, "".join(cur), b_idx, l_idx, word_no))
+                            word_no += 1
+                            cur = []
+                        continue
+                    cx0, cy0, cx1, cy1 = ch.get("bbox", (0, 0, 0, 0))
+                    if cur:
+                        wx0, wy0 = min(wx0, cx0), min(wy0, cy0)
+                        wx1, wy1 = max(wx1, cx1), max(wy1, cy1)
+                    else:
+                        wx0, wy0, wx1, wy1 = cx0, cy0, cx1, cy1
+                    cur.append(c)
+            if cur:
+                words.append((wx0, wy0, wx1, wy1, "".join(cur), b_idx, l_idx, word_no))
+
+            x0, y0, x1, y1 = ln.get("bbox", [0, 0, 0, 0])
+            info[(b_idx, l_idx)] = {
+                "size_avg": sum(sizes) / max(1, len(sizes)),
+                "y0": float(y0),
+                "text": "".join(parts).strip(),
+            }
+    return words, info
 
 # -------------------------------------------------------------------
 # Word extraction WITH layout metadata (title/caption detection)
 # -------------------------------------------------------------------
 
 def extract_words_with_boxes(pdf_path: str, page_number: int) -> List[Dict]:
+    """Words + layout metadata for one page, memoized per (path, page, mtime)."""
     try:
-        try:
-            import pymupdf as fitz
-        except Exception:
-            import fitz
-    except Exception:
-        return []
+        mtime = os.path.getmtime(pdf_path)
+    except OSError:
+        return _extract_words_with_boxes_uncached(pdf_path, page_number)
+    return list(_cached_words(pdf_path, int(page_number), mtime))
 
-    try:
-        doc = fitz.open(pdf_path)
-        page = doc[page_number - 1]
-    except Exception:
-        return []
 
-    line_info = _index_line_layout(page)
+@lru_cache(maxsize=256)
+def _cached_words(pdf_path: str, page_number: int, mtime: float) -> Tuple[Dict, ...]:
+    # Shared read-only word dicts; callers only read them
+    return tuple(_extract_words_with_boxes_uncached(pdf_path, page_number))
 
-    # words: (x0,y0,x1,y1, "text", block, line, word_no)
-    try:
-        words_raw = page.get_text("words")
-    except Exception:
-        return []
+
+def clear_cache() -> None:
+    """Drop memoized page words and embeddings (call when a generation run ends)."""
+    _cached_words.cache_clear()
+    with _EMB_LOCK:
+        _EMB_CACHE.clear()
+
+
+def _extract_words_with_boxes_uncached(pdf_path: str, page_number: int) -> List[Dict]:
+    with _FITZ_LOCK:
+        try:
+            # Same cached Document the page renders use (one parse per PDF)
+            doc = _open_doc(pdf_path)
+            page = doc[page_number - 1]
+        except Exception:
+            return []
+
+        # words + per-line layout from a single MuPDF text pass
+        words_raw, line_info = _index_line_layout(page)
+        try:
+            page_h = float(page.rect.height or 1.0)
+        except Exception:
+            return []
 
     # median font size
     sizes = [v["size_avg"] for v in line_info.values() if v.get("size_avg")]
-    median_size = sorted(sizes)[len(sizes)//2] if sizes else 0.0
-
-    page_h = float(page.rect.height or 1.0)
-    caption_re = re.compile(CAPTION_PREFIXES, flags=re.I)
+    median_size = statistics.median_high(sizes) if sizes else 0.0
 
     out = []
     for w in words_raw:
@@ -223,12 +437,13 @@ def extract_words_with_boxes(pdf_path: str, page_number: int) -> List[Dict]:
                     is_title = True
 
         # Caption?
-        is_caption = bool(caption_re.match(line_text.strip()))
+        is_caption = bool(_CAPTION_RE.match(line_text.strip()))
 
-        ends = bool(re.search(r"[.!?;:]\s*$", str(text or "")))
+        text = str(text or "")
+        ends = text.rstrip().endswith(_SENT_ENDS)
 
         out.append({
-            "text": str(text or ""),
+            "text": text,
             "x0": float(x0), "y0": float(y0),
             "x1": float(x1), "y1": float(y1),
             "block": int(block), "line": int(line),
@@ -248,6 +463,19 @@ def extract_words_with_boxes(pdf_path: str, page_number: int) -> List[Dict]:
 # -------------------------------------------------------------------
 # SEMANTIC SENTENCE → RECTANGLES
 # -------------------------------------------------------------------
+def _bounds(words) -> Tuple[float, float, float, float]:
+    """(x0, y0, x1, y1) enclosing the word boxes in a single pass."""
+    it = iter(words)
+    w = next(it)
+    x0, y0, x1, y1 = w["x0"], w["y0"], w["x1"], w["y1"]
+    for w in it:
+        if w["x0"] < x0: x0 = w["x0"]
+        if w["y0"] < y0: y0 = w["y0"]
+        if w["x1"] > x1: x1 = w["x1"]
+        if w["y1"] > y1: y1 = w["y1"]
+    return x0, y0, x1, y1
+
+
 def semantic_sentence_rects(
     words,
     answer_text,
@@ -264,24 +492,10 @@ def semantic_sentence_rects(
     - If best match is huge, tries the next-best candidate
     """
 
-    # ------------------------
-    # SAFE LOCAL DEBUG LOGGER
-    # ------------------------
-    def _dbg_local(msg: str) -> None:
-        try:
-            from aqt import mw
-            import os, time
-            path = os.path.join(mw.pm.profileFolder(), "pdf2cards_debug.log")
-            ts = time.strftime("%Y-%m-%d %H:%M:%S")
-            with open(path, "a", encoding="utf-8") as f:
-                f.write(f"[{ts}] [semantic_hi] {msg}\n")
-        except Exception:
-            pass
-
     try:
         # DEBUG
-        _dbg_local(f"DEBUG answer_text='{(answer_text or '')[:120]}'")
-        _dbg_local(f"DEBUG words_count={len(words or [])}")
+        _dbg(f"DEBUG answer_text='{(answer_text or '')[:120]}'")
+        _dbg(f"DEBUG words_count={len(words or [])}")
 
         # --------------------------------------------------------------------
         # 1. If title/caption filtering deletes everything, restore all words
@@ -292,14 +506,14 @@ def semantic_sentence_rects(
         ]
         if not usable:
             usable = list(words or [])
-            _dbg_local("DEBUG usable was empty after filtering → restored all words")
+            _dbg("DEBUG usable was empty after filtering → restored all words")
 
         if not usable:
-            _dbg_local("No usable words or empty page → return []")
+            _dbg("No usable words or empty page → return []")
             return []
 
         if not (answer_text or "").strip():
-            _dbg_local("Answer text empty → return []")
+            _dbg("Answer text empty → return []")
             return []
 
         # --------------------------------------------------------------------
@@ -318,118 +532,136 @@ def semantic_sentence_rects(
 
         if not sentences:
             # fallback to line groups
-            line_groups = {}
+            line_groups = defaultdict(list)
             for i, w in enumerate(usable):
-                line_groups.setdefault((w["block"], w["line"]), []).append(i)
+                line_groups[(w["block"], w["line"])].append(i)
             for _, idxs in line_groups.items():
                 text = " ".join(usable[j]["text"] for j in idxs).strip()
                 if text:
                     sentences.append({"text": text, "idxs": idxs[:]})
 
         if not sentences:
-            _dbg_local("Sentence extraction produced 0 sentences → return []")
+            _dbg("Sentence extraction produced 0 sentences → return []")
             return []
 
-        _dbg_local(f"DEBUG sentences_count={len(sentences)}")
+        _dbg(f"DEBUG sentences_count={len(sentences)}")
+
+        # compute "page" bounds from usable words (one pass, not four)
+        page_x0, page_y0, page_x1, page_y1 = _bounds(usable)
+        page_area = max(1e-6, (page_x1 - page_x0) * (page_y1 - page_y0))
+
+        def _first_fitting(ranked_idx):
+            """Rect of the first candidate that isn't oversized, else None."""
+            for idx in ranked_idx:
+                sent = sentences[idx]
+
+                if not sent["idxs"]:
+                    continue
+                x0, y0, x1, y1 = _bounds(usable[wi] for wi in sent["idxs"])
+
+                # tight rect
+                rect = {
+                    "x": x0 - pad,
+                    "y": y0 - pad,
+                    "w": (x1 - x0) + 2 * pad,
+                    "h": (y1 - y0) + 2 * pad,
+                }
+
+                # compute rectangle area
+                rect_area = (x1 - x0) * (y1 - y0)
+                ratio = rect_area / page_area
+
+                _dbg(f"DEBUG candidate idx={idx} rect_ratio={ratio:.3f}")
+
+                # reject if too large
+                if ratio > 0.35:
+                    _dbg("DEBUG → oversized rect rejected; trying next candidate")
+                    continue
+
+                # ACCEPTED rectangle!
+                _dbg("DEBUG → accepted rectangle")
+                return rect
+            return None
+
+        # --------------------------------------------------------------------
+        # 3a. Lexical fast path: a sentence holding (nearly) the whole answer
+        #     wins outright — no embeddings request for this card.
+        # --------------------------------------------------------------------
+        findall = _WORD_RE.findall
+        atoks_list = findall(answer_text.lower())
+        atoks = set(atoks_list)
+        if len(atoks) >= LEXICAL_MIN_TOKENS:
+            ans_norm = " " + " ".join(atoks_list) + " "
+            hits = []
+            for i, s in enumerate(sentences):
+                stoks_list = findall(s["text"].lower())
+                cover = len(atoks.intersection(stoks_list)) / len(atoks)
+                if ans_norm in " " + " ".join(stoks_list) + " ":
+                    cover = 1.0 + 1e-3  # verbatim beats a token-set match
+                if cover >= LEXICAL_MIN_COVERAGE:
+                    hits.append((cover, i))
+            if hits:
+                hits.sort(reverse=True, key=lambda x: x[0])
+                rect = _first_fitting([idx for _, idx in hits])
+                if rect is not None:
+                    _dbg(f"DEBUG lexical fast path hit ({len(hits)} candidates)")
+                    return [rect]
 
         # --------------------------------------------------------------------
-        # 3. Embed answer + sentences
+        # 3b. Embed answer + sentences
         # --------------------------------------------------------------------
         combined = [answer_text] + [s["text"] for s in sentences]
         try:
             embs = embed_texts(combined, api_key)
         except Exception as e:
-            _dbg_local(f"Embedding error: {e}")
+            _dbg(f"Embedding error: {e}")
             embs = None
 
         # rank candidates
         if embs and len(embs) == len(combined):
-            ans_emb = embs[0]
+            ans_unit = embs[0]  # embed_texts returns unit vectors
             sims = []
 
             for i, se in enumerate(embs[1:]):
                 try:
-                    sims.append((_cosine(ans_emb, se), i))
+                    sims.append((_dot(ans_unit, se), i))
                 except:
                     sims.append((-1.0, i))
 
             sims.sort(reverse=True, key=lambda x: x[0])
             ranked_idx = [idx for _, idx in sims]
-            _dbg_local(f"DEBUG ranked_idx (embeddings)={ranked_idx}")
+            _dbg(f"DEBUG ranked_idx (embeddings)={ranked_idx}")
 
         else:
             # lexical fallback
-            _dbg_local("Embeddings unavailable → fallback lexical matcher")
-            atoks = set(re.findall(r"\w+", answer_text.lower()))
+            _dbg("Embeddings unavailable → fallback lexical matcher")
             scores = []
 
             for i, s in enumerate(sentences):
-                stoks = set(re.findall(r"\w+", s["text"].lower()))
-                overlap = len(atoks & stoks)
+                overlap = len(atoks.intersection(findall(s["text"].lower())))
                 scores.append((overlap, i))
 
             scores.sort(reverse=True, key=lambda x: x[0])
             ranked_idx = [idx for _, idx in scores]
-            _dbg_local(f"DEBUG ranked_idx (lexical)={ranked_idx}")
+            _dbg(f"DEBUG ranked_idx (lexical)={ranked_idx}")
 
         if not ranked_idx:
-            _dbg_local("No ranked candidates → return []")
+            _dbg("No ranked candidates → return []")
             return []
 
         # --------------------------------------------------------------------
         # 4. Try candidates IN ORDER, rejecting oversized rectangles.
         # --------------------------------------------------------------------
-        # compute "page" bounds from usable words
-        page_x0 = min(w["x0"] for w in usable)
-        page_y0 = min(w["y0"] for w in usable)
-        page_x1 = max(w["x1"] for w in usable)
-        page_y1 = max(w["y1"] for w in usable)
-        page_area = max(1e-6, (page_x1 - page_x0) * (page_y1 - page_y0))
-
-        for idx in ranked_idx:
-            sent = sentences[idx]
-
-            xs, ys, xe, ye = [], [], [], []
-            for wi in sent["idxs"]:
-                w = usable[wi]
-                xs.append(w["x0"]); ys.append(w["y0"])
-                xe.append(w["x1"]); ye.append(w["y1"])
-
-            if not xs:
-                continue
-
-            x0, y0 = min(xs), min(ys)
-            x1, y1 = max(xe), max(ye)
-
-            # tight rect
-            rect = {
-                "x": x0 - pad,
-                "y": y0 - pad,
-                "w": (x1 - x0) + 2 * pad,
-                "h": (y1 - y0) + 2 * pad,
-            }
-
-            # compute rectangle area
-            rect_area = (x1 - x0) * (y1 - y0)
-            ratio = rect_area / page_area
-
-            _dbg_local(f"DEBUG candidate idx={idx} rect_ratio={ratio:.3f}")
-
-            # reject if too large
-            if ratio > 0.35:
-                _dbg_local("DEBUG → oversized rect rejected; trying next candidate")
-                continue
-
-            # ACCEPTED rectangle!
-            _dbg_local("DEBUG → accepted rectangle")
+        rect = _first_fitting(ranked_idx)
+        if rect is not None:
             return [rect]
 
         # If we reach here, ALL rects were too large
-        _dbg_local("All candidates were oversized → return []")
+        _dbg("All candidates were oversized → return []")
         return []
 
     except Exception as e:
-        _dbg_local(f"FATAL semantic_sentence_rects: {e}")
+        _dbg(f"FATAL semantic_sentence_rects: {e}")
         return []
 # -------------------------------------------------------------------
 # Compatibility stubs expected by main.py (kept minimal)
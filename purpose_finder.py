@@ -1,8 +1,6 @@
 # purpose_finder.py
 from __future__ import annotations
 import html
-import json
-import time
 from typing import Optional
 import re
 
@@ -13,20 +11,14 @@ from aqt.qt import (
 )
 from aqt.utils import showWarning, tooltip
 
-import requests
+from .debug_log import log as _log
 
 
 # ---------------------------------------------------------
 # Logger
 # ---------------------------------------------------------
 def _dbg(msg: str) -> None:
-    try:
-        path = mw.pm.profileFolder() + "/pdf2cards_debug.log"
-        ts = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"[{ts}] [purpose] {msg}\n")
-    except Exception:
-        pass
+    _log(msg, "purpose")
 
 
 # ---------------------------------------------------------
@@ -164,17 +156,13 @@ def _ask_purpose(selected_text: str, api_key: str) -> str:
         "temperature": TEMPERATURE
     }
 
-    resp = requests.post(
-        OPENAI_API_URL,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json=payload,
-        timeout=60
-    )
+    # deferred: openai_cards (and requests) only load once the user asks.
+    # Pooled session + orjson body/response parsing, same as the card calls.
+    from .openai_cards import _post_openai, _resp_json
+
+    resp = _post_openai(OPENAI_API_URL, api_key, payload, timeout=60)
     resp.raise_for_status()
-    return resp.json()["choices"][0]["message"]["content"].strip()
+    return _resp_json(resp)["choices"][0]["message"]["content"].strip()
 
 
 # ---------------------------------------------------------